@@ -0,0 +1,205 @@
+import hashlib
+from datetime import date
+
+from flask import Blueprint, jsonify, request, url_for
+from flask_login import login_required, current_user
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Sprint
+from utilities import bug_filters_from_args, page_size_from_args, get_bug_reports_page, get_sprints_page, \
+    check_existing_bug_report_by_number, check_existing_sprint_by_name, find_sprint_id_for_date, parse_date, \
+    bug_status, bug_number_exists
+from workflow import create_bug, close_bug, fix_bug, create_sprint, transition_bugs, BATCH_STATES, MAX_BATCH_SIZE
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def bug_report_json(report):
+    return {
+        'number': report.number,
+        'bug_type': report.bug_type,
+        'description': report.description,
+        'status': bug_status(report),
+        'reason_for_close': report.reason_for_close,
+        'created': report.created.isoformat(),
+        'reporter_id': report.user_id,
+        'sprint_id': report.sprint_id,
+        'version': report.version,
+    }
+
+
+def sprint_json(sprint):
+    return {
+        'id': sprint.id,
+        'name': sprint.name,
+        'start_date': sprint.start_date.isoformat(),
+        'end_date': sprint.end_date.isoformat(),
+    }
+
+
+def is_bug_number(value):
+    # JSON true/false arrive as bool, which is a subclass of int.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def bug_report_etag(report):
+    return f'bug-{report.id}-{report.version}'
+
+
+def list_etag(kind, keys):
+    return f'{kind}-' + hashlib.sha1(repr(keys).encode('utf-8')).hexdigest()
+
+
+def error_response(status, message):
+    return jsonify(error=message), status
+
+
+def conditional_json(payload, etag, status=200):
+    response = jsonify(payload)
+    response.status_code = status
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def json_body():
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else None
+
+
+def find_bug_report(number):
+    report = check_existing_bug_report_by_number(number)
+    if report is None:
+        return None, error_response(404, f'Bug report #{number} not found')
+    if request.if_match and not request.if_match.contains(bug_report_etag(report)):
+        return None, error_response(412, f'Bug report #{number} has changed')
+    return report, None
+
+
+@api.route('/bugs', methods=['GET'])
+@login_required
+def list_bugs():
+    reports, next_after = get_bug_reports_page(after=request.args.get('after', type=int),
+                                               limit=page_size_from_args(request.args),
+                                               **bug_filters_from_args(request.args))
+    return conditional_json({'bugs': [bug_report_json(report) for report in reports], 'next_after': next_after},
+                            list_etag('bugs', [(report.id, report.version) for report in reports] + [next_after]))
+
+
+@api.route('/bugs', methods=['POST'])
+@login_required
+def create_bug_report():
+    body = json_body()
+    if body is None or not all(body.get(field) for field in ('number', 'bug_type', 'description')):
+        return error_response(400, 'number, bug_type and description are required')
+    if not is_bug_number(body['number']):
+        return error_response(400, 'number must be an integer')
+    report_date = body.get('date') or date.today()
+    if isinstance(report_date, str):
+        report_date = parse_date(report_date)
+    if not isinstance(report_date, date):
+        return error_response(400, 'date must be an ISO date')
+    if bug_number_exists(body['number']):
+        return error_response(409, 'Bug report already exists!')
+    sprint_id = find_sprint_id_for_date(report_date)
+    if sprint_id is None:
+        return error_response(422, 'There is no sprint for this date yet, please create one!')
+    report, duplicates = create_bug(body['number'], body['bug_type'], body['description'], current_user.id,
+                                    sprint_id, subscribe=bool(body.get('subscribe')))
+    response = conditional_json({'bug': bug_report_json(report),
+                                 'possible_duplicates': [number for number, _ in duplicates]},
+                                bug_report_etag(report), status=201)
+    response.headers['Location'] = url_for('api.get_bug', number=report.number)
+    return response
+
+
+@api.route('/bugs/<int:number>', methods=['GET'])
+@login_required
+def get_bug(number):
+    report = check_existing_bug_report_by_number(number)
+    if report is None:
+        return error_response(404, f'Bug report #{number} not found')
+    return conditional_json(bug_report_json(report), bug_report_etag(report))
+
+
+@api.route('/bugs/<int:number>/close', methods=['POST'])
+@login_required
+def close_bug_report(number):
+    report, error = find_bug_report(number)
+    if error:
+        return error
+    body = json_body() or {}
+    try:
+        if not close_bug(report, body.get('reason', '')):
+            return error_response(409, 'Bug report is already closed or marked as fixed')
+    except StaleDataError:
+        db.session.rollback()
+        return error_response(409, f'Bug report #{number} was changed concurrently')
+    return conditional_json(bug_report_json(report), bug_report_etag(report))
+
+
+@api.route('/bugs/<int:number>/fix', methods=['POST'])
+@login_required
+def fix_bug_report(number):
+    report, error = find_bug_report(number)
+    if error:
+        return error
+    try:
+        if not fix_bug(report):
+            return error_response(409, 'Bug report is already fixed or closed')
+    except StaleDataError:
+        db.session.rollback()
+        return error_response(409, f'Bug report #{number} was changed concurrently')
+    return conditional_json(bug_report_json(report), bug_report_etag(report))
+
+
+@api.route('/bugs/batch', methods=['POST'])
+@login_required
+def batch_transition():
+    body = json_body()
+    if body is None or body.get('state') not in BATCH_STATES:
+        return error_response(400, f"state must be one of {', '.join(BATCH_STATES)}")
+    numbers = body.get('numbers')
+    if not isinstance(numbers, list) or not numbers or not all(is_bug_number(number) for number in numbers):
+        return error_response(400, 'numbers must be a non-empty list of bug numbers')
+    if len(numbers) > MAX_BATCH_SIZE:
+        return error_response(413, f'At most {MAX_BATCH_SIZE} bug reports can be changed at once')
+    outcomes = transition_bugs(numbers, body['state'], body.get('reason', ''))
+    return jsonify(results=[{'number': number, 'outcome': outcome} for number, outcome in outcomes.items()])
+
+
+@api.route('/sprints', methods=['GET'])
+@login_required
+def list_sprints():
+    # Sprints are never edited, so their ids alone identify the representation.
+    sprints, next_after = get_sprints_page(after=request.args.get('after', type=int),
+                                           limit=page_size_from_args(request.args))
+    return conditional_json({'sprints': [sprint_json(sprint) for sprint in sprints], 'next_after': next_after},
+                            list_etag('sprints', [sprint.id for sprint in sprints] + [next_after]))
+
+
+@api.route('/sprints', methods=['POST'])
+@login_required
+def create_sprint_entry():
+    body = json_body()
+    if body is None or not body.get('name'):
+        return error_response(400, 'name, start_date and end_date are required')
+    start_date, end_date = parse_date(str(body.get('start_date', ''))), parse_date(str(body.get('end_date', '')))
+    if start_date is None or end_date is None or start_date > end_date:
+        return error_response(400, 'start_date and end_date must be ISO dates with start_date <= end_date')
+    if check_existing_sprint_by_name(body['name']):
+        return error_response(409, 'Sprint already exists!')
+    sprint = create_sprint(body['name'], start_date, end_date)
+    response = conditional_json(sprint_json(sprint), f'sprint-{sprint.id}', status=201)
+    response.headers['Location'] = url_for('api.get_sprint', sprint_id=sprint.id)
+    return response
+
+
+@api.route('/sprints/<int:sprint_id>', methods=['GET'])
+@login_required
+def get_sprint(sprint_id):
+    sprint = db.session.get(Sprint, sprint_id)
+    if sprint is None:
+        return error_response(404, f'Sprint {sprint_id} not found')
+    return conditional_json(sprint_json(sprint), f'sprint-{sprint.id}')
@@ -1,40 +1,92 @@
-import base64
+import os
 import secrets
 
-from flask import Flask, render_template, redirect, url_for, request, abort, flash
+from flask import Flask, render_template, redirect, url_for, request, abort, flash, make_response, jsonify, \
+    Response, stream_with_context
 from flask_login import login_user, login_required, logout_user, LoginManager, current_user
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from io import BytesIO
-import matplotlib.pyplot as plt
-from werkzeug.security import check_password_hash
-
-from forms import RegistrationForm, LoginForm, SprintForm, BugReportForm, ChangePasswordForm
-from models import User, db, BugReport, Sprint
-from utilities import check_existing_employee, check_existing_username, hash_password, check_existing_sprint_by_name, \
-    check_date_in_sprint, get_existing_user, check_existing_bug_report_by_number, send_email, check_existing_email
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from api import api
+from charts import get_chart_cache, png_charts_available, CHART_FORMATS, CHART_RENDERERS
+from commands import register_commands
+from database import database_url, engine_options, is_file_sqlite, apply_sqlite_pragmas, sqlite_pragmas
+from duplicates import ensure_duplicate_index, get_duplicate_index
+from exports import EXPORT_FORMATS, EXPORT_GENERATORS
+from forms import RegistrationForm, LoginForm, SprintForm, BugReportForm, ChangePasswordForm, \
+    NotificationSettingsForm, BatchTransitionForm
+from identity import get_identity_cache, load_cached_user
+from instrumentation import init_instrumentation, timed
+from migrations import upgrade_database
+from models import User, db, BugReport
+from notifications import start_outbox_worker
+from passwords import PasswordHasherBusy, get_password_hasher, password_hash_method
+from search import SEARCH_CANDIDATES, search_bug_reports
+from utilities import check_existing_username, check_existing_sprint_by_name, check_existing_bug_report_by_number, \
+    bug_filters_from_args, page_size_from_args, get_bug_reports_page, get_sprints_page, find_sprint_id_for_date, \
+    get_sprint_bug_counts, get_data_version, get_bug_report_detail, is_subscribed, subscribe_user, \
+    unsubscribe_user, parse_bug_numbers, find_user_conflicts, USER_UNIQUE_FIELDS, bug_number_exists, \
+    get_archived_bug_report
+from workflow import create_bug, edit_bug, close_bug, fix_bug, create_sprint, transition_bugs, MAX_BATCH_SIZE
 
 
 def create_app(testing=False):
     app = Flask(__name__)
     if testing:
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('test_database_url') or 'sqlite:///:memory:'
     else:
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///brs.db'
-    app.secret_key = secrets.token_hex()
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url('sqlite:///brs.db')
+    app.config['STATISTICS_CHART_FORMAT'] = os.getenv('statistics_chart_format', 'svg')
+    app.config['NOTIFICATION_DIGEST_WINDOW'] = int(os.getenv('notification_digest_window', 3600))
+    app.config['DUPLICATE_INDEX_PATH'] = None if testing else os.path.join(app.instance_path,
+                                                                           'duplicate_index.jsonl')
+    if not testing:
+        # Only a SQLite database_url under instance/ would otherwise create the directory the index log lives in.
+        os.makedirs(app.instance_path, exist_ok=True)
+    app.config['NOTIFICATION_WORKER'] = not testing and os.getenv('notification_worker', 'true').lower() != 'false'
+    app.config['INSTRUMENTATION'] = os.getenv('instrumentation', 'false').lower() == 'true'
+    app.config['PROFILE_SLOW_REQUESTS_MS'] = int(os.getenv('profile_slow_requests_ms', 0))
+    app.config['PROFILE_DIRECTORY'] = os.path.join(app.instance_path, 'profiles')
+    app.config['METRICS_DIRECTORY'] = os.getenv('metrics_directory') or None
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('archive_after_days', 180))
+    app.config['IDENTITY_CACHE_SIZE'] = int(os.getenv('identity_cache_size', 10000))
+    app.config['IDENTITY_CACHE_TTL'] = int(os.getenv('identity_cache_ttl', 300))
+    app.config['PASSWORD_HASH_METHOD'] = password_hash_method()
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('password_hash_workers', max(1, (os.cpu_count() or 2) // 2)))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('password_hash_max_pending',
+                                                            app.config['PASSWORD_HASH_WORKERS'] * 8))
+    app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = float(os.getenv('password_hash_queue_timeout', 5))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    # Every worker process must sign sessions with the same key, so production deployments set secret_key.
+    app.secret_key = os.getenv('secret_key') or secrets.token_hex()
     db.init_app(app)
+    if is_file_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        with app.app_context():
+            apply_sqlite_pragmas(db.engine, sqlite_pragmas())
     login_manager = LoginManager()
     login_manager.login_view = 'login'
     login_manager.init_app(app)
+    register_commands(app)
+    app.register_blueprint(api)
+    if app.config['INSTRUMENTATION']:
+        with app.app_context():
+            init_instrumentation(app, db.engine)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
 
     @login_manager.unauthorized_handler
     def unauthorized_callback():
+        if request.blueprint == 'api':
+            return jsonify(error='Authentication required'), 401
         return redirect('/login?next=' + request.path)
 
+    @app.before_request
+    def ensure_outbox_worker():
+        if app.config['NOTIFICATION_WORKER']:
+            start_outbox_worker(app)
+
     @app.route('/')
     def home():
         if current_user.is_authenticated:
@@ -47,19 +99,24 @@ def create_app(testing=False):
         form = RegistrationForm()
         if request.method == 'POST':
             if form.validate_on_submit():
-                if check_existing_username(form.username.data):
-                    flash('Username already exists!', 'error')
-                elif check_existing_employee(form.employee_id.data):
-                    flash('Employee ID already exists!', 'error')
-                elif check_existing_email(form.email.data):
-                    flash('Email already exists!', 'error')
-                else:
-                    user = User(username=form.username.data, email=form.email.data,
-                                password=hash_password(form.password.data),
-                                employee_id=form.employee_id.data)
-                    db.session.add(user)
+                try:
+                    password = get_password_hasher().hash(form.password.data)
+                except PasswordHasherBusy:
+                    flash('The server is busy, please try again in a moment', 'error')
+                    return render_template('register.html', form=form), 503
+                # The unique constraints decide; only a failed insert pays for finding out which field collided.
+                db.session.add(User(username=form.username.data, email=form.email.data, password=password,
+                                    employee_id=form.employee_id.data))
+                try:
                     db.session.commit()
                     return redirect(url_for('login'))
+                except IntegrityError:
+                    db.session.rollback()
+                conflicts = find_user_conflicts(form.username.data, form.employee_id.data, form.email.data)
+                for field in conflicts:
+                    flash(f'{USER_UNIQUE_FIELDS[field]} already exists!', 'error')
+                if not conflicts:
+                    flash('Could not create the account, please try again', 'error')
 
                 # return render_template("register.html", form=form, error_message=error)
             else:
@@ -74,7 +131,17 @@ def create_app(testing=False):
         if request.method == 'POST':
             if form.validate_on_submit():
                 user = check_existing_username(form.username.data)
-                if user and check_password_hash(user.password, form.password.data):
+                hasher = get_password_hasher()
+                try:
+                    valid = hasher.verify(user.password if user is not None else None, form.password.data)
+                    if valid and hasher.needs_rehash(user.password):
+                        # Upgrade hashes made with older or weaker parameters while the plain password is at hand.
+                        user.password = hasher.hash(form.password.data)
+                        db.session.commit()
+                except PasswordHasherBusy:
+                    flash('Too many sign-ins right now, please try again in a moment', 'error')
+                    return render_template('login.html', form=form), 503
+                if valid:
                     login_user(user)
                     if form.next.data == '' or form.next.data is None:
                         return redirect(url_for('home'))
@@ -92,34 +159,93 @@ def create_app(testing=False):
         form = ChangePasswordForm()
 
         if form.validate_on_submit():
-            if not check_password_hash(current_user.password, form.current_password.data):
-                flash('Current password is incorrect', 'error')
-            else:
-                current_user.password = hash_password(form.new_password.data)
-                db.session.commit()
-                flash('Password changed successfully', 'success')
+            user = db.session.get(User, current_user.id)
+            hasher = get_password_hasher()
+            try:
+                if not hasher.verify(user.password, form.current_password.data):
+                    flash('Current password is incorrect', 'error')
+                else:
+                    user.password = hasher.hash(form.new_password.data)
+                    db.session.commit()
+                    get_identity_cache().invalidate(user.id)
+                    flash('Password changed successfully', 'success')
+            except PasswordHasherBusy:
+                flash('The server is busy, please try again in a moment', 'error')
+                return render_template('change_password.html', form=form), 503
 
         return render_template('change_password.html', form=form)
 
+    @app.route('/notification_settings', methods=['GET', 'POST'])
+    @login_required
+    def notification_settings():
+        form = NotificationSettingsForm()
+
+        if form.validate_on_submit():
+            db.session.get(User, current_user.id).digest_notifications = form.digest_notifications.data
+            db.session.commit()
+            get_identity_cache().invalidate(current_user.id)
+            flash('Notification settings saved', 'success')
+        else:
+            form.digest_notifications.data = current_user.digest_notifications
+
+        return render_template('notification_settings.html', form=form,
+                               digest_hours=app.config['NOTIFICATION_DIGEST_WINDOW'] / 3600)
+
     @app.route('/logout')
     @login_required
     def logout():
+        get_identity_cache().invalidate(current_user.id)
         logout_user()
         return redirect(url_for('home'))
 
     @app.route('/bugs')
     @login_required
     def bugs():
-        return render_template('bugs.html',
-                               bugs=BugReport.query.all(), sprints=Sprint.query.all())
+        filters = bug_filters_from_args(request.args)
+        limit = page_size_from_args(request.args)
+        bug_page, next_after = get_bug_reports_page(after=request.args.get('after', type=int), limit=limit,
+                                                    **filters)
+        return render_template('bugs.html', bugs=bug_page, next_after=next_after, filters=filters, limit=limit)
+
+    @app.route('/bugs/export.<export_format>')
+    @login_required
+    def export_bugs(export_format):
+        if export_format not in EXPORT_FORMATS:
+            abort(404)
+        filters = bug_filters_from_args(request.args)
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        response = Response(stream_with_context(EXPORT_GENERATORS[export_format](filters, include_archived)),
+                            mimetype=EXPORT_FORMATS[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename=bug_reports.{export_format}'
+        return response
+
+    @app.route('/bugs/search')
+    @login_required
+    def search_bugs():
+        query = request.args.get('q', '')
+        page = max(request.args.get('page', 1, type=int), 1)
+        limit = page_size_from_args(request.args)
+        results, has_next, truncated = search_bug_reports(query, page=page, limit=limit)
+        return render_template('bug_search.html', query=query, results=results, page=page, has_next=has_next,
+                               limit=limit, truncated=truncated, candidates=SEARCH_CANDIDATES)
+
+    @app.route('/sprints')
+    @login_required
+    def sprints():
+        limit = page_size_from_args(request.args)
+        sprint_page, next_after = get_sprints_page(after=request.args.get('after', type=int), limit=limit)
+        return render_template('sprints.html', sprints=sprint_page, next_after=next_after, limit=limit)
 
     @app.route('/bugs/<int:bug_id>')
     @login_required
     def bug(bug_id):
-        bug_found = BugReport.query.filter_by(number=bug_id).first()
+        bug_found = get_bug_report_detail(bug_id)
         if bug_found is None:
-            abort(404)
-        return render_template('bug.html', bug=bug_found)
+            archived = get_archived_bug_report(bug_id)
+            if archived is None:
+                abort(404)
+            return render_template('bug.html', bug=archived, archived=True)
+        return render_template('bug.html', bug=bug_found, archived=False)
 
     @app.route('/bug_report', methods=['GET', 'POST'])
     @login_required
@@ -128,31 +254,22 @@ def create_app(testing=False):
 
         if request.method == 'POST':
             if form.validate_on_submit():
-                if check_existing_bug_report_by_number(form.report_number.data) is not None:
+                if bug_number_exists(form.report_number.data):
                     # Check if bug report exists
                     error = 'Bug report already exists!'
                     flash(error, 'error')
                     return redirect(url_for('bug_report'))
                 else:
-                    check_sprint = check_date_in_sprint(form.current_date.data)
-                    if check_sprint:
-                        insert_bug_report = BugReport(
-                            number=form.report_number.data,
-                            bug_type=form.bug_type.data,
-                            description=form.bug_summary.data,
-                            is_open=True,
-                            is_fixed=False,
-                            reason_for_close="",
-                            user_id=current_user.id,
-                            sprint_id=check_sprint.id
-                        )
+                    sprint_id = find_sprint_id_for_date(form.current_date.data)
+                    if sprint_id is not None:
                         subscribed = bool(request.form.get('update_notification'))
-                        if subscribed:  # Check if checkboxes for subscription are checked
-                            current_user.subscribed_bug_reports.append(insert_bug_report)
-
-                        db.session.add(insert_bug_report)  # Add to database
-                        db.session.commit()
+                        _, duplicates = create_bug(form.report_number.data, form.bug_type.data,
+                                                   form.bug_summary.data, current_user.id, sprint_id,
+                                                   subscribe=subscribed)
                         flash('Bug Report Created', 'success')
+                        if duplicates:
+                            flash('Possible duplicates: ' + ', '.join(
+                                f'#{number} ({similarity:.0%} similar)' for number, similarity in duplicates), 'warning')
                         return redirect(url_for('bug_report'))  # Redirect back to the bug report page after submission
                     else:
                         flash("There is no sprint for this date yet, please create one!", 'error')
@@ -166,17 +283,12 @@ def create_app(testing=False):
             flash('Bug report not found', 'error')
             return redirect(url_for('bugs') + "/" + str(bug_report_id))
 
-        user = get_existing_user(int(current_user.id))
-        if user is None:
-            flash('User not found', 'error')
-            return redirect(url_for('bugs') + "/" + str(report.number))
-
-        if user in report.subscribers:
-            report.subscribers.remove(user)
+        if is_subscribed(report.id, current_user.id):
+            unsubscribe_user(report.id, current_user.id)
             db.session.commit()
             flash('User unsubscribed successfully', 'success')
         else:
-            report.subscribers.append(user)
+            subscribe_user(report.id, current_user.id)
             db.session.commit()
             flash('User subscribed successfully', 'success')
 
@@ -189,19 +301,20 @@ def create_app(testing=False):
         if report is None:
             return redirect(url_for('bugs'))
 
-        report_number = request.form.get('report_number')
-        if report_number:
-            report.number = report_number
-
-        bug_type = request.form.get('bug_type')
-        if bug_type:
-            report.bug_type = bug_type
-
-        description = request.form.get('description')
-        if description:
-            report.description = description
-
-        db.session.commit()
+        number = request.form.get('report_number')
+        if number and not number.strip().isdigit():
+            flash('Bug number must be a whole number', 'error')
+            return redirect(url_for('bugs') + "/" + str(bug_report_id))
+        number = int(number) if number else None
+        # A live report must not take an archived report's number, or the archived one can no longer be reached.
+        if number is not None and number != report.number and bug_number_exists(number):
+            flash(f'Bug report #{number} already exists!', 'error')
+            return redirect(url_for('bugs') + "/" + str(bug_report_id))
+        try:
+            edit_bug(report, number=number, bug_type=request.form.get('bug_type'),
+                     description=request.form.get('description'))
+        except StaleDataError:
+            return concurrent_change(bug_report_id)
         flash('Bug report updated successfully', 'success')
 
         return redirect(url_for('bugs') + "/" + str(report.number))
@@ -212,14 +325,12 @@ def create_app(testing=False):
         report: BugReport = check_existing_bug_report_by_number(bug_report_id)
         if report is None:
             return redirect(url_for('bugs'))
-        if report.is_open and not report.is_fixed:
-            report.is_open = False
-            report.reason_for_close = request.form['close_reason']
-            db.session.commit()
+        try:
+            closed = close_bug(report, request.form['close_reason'])
+        except StaleDataError:
+            return concurrent_change(bug_report_id)
+        if closed:
             flash('Bug report closed successfully', 'success')
-            for subscriber in report.subscribers:
-                send_email(subscriber.email, f"Bug report #{bug_report_id} is closed", f"Please see the bug report and reasoning below: \n\n{report.description}\n\nReason:\n\n{report.reason_for_close}")
-
         else:
             flash('Bug report is already closed or marked as fixed', 'error')
         return redirect(url_for('bugs') + "/" + str(bug_report_id))
@@ -228,17 +339,43 @@ def create_app(testing=False):
     @login_required
     def fix_bug_report(bug_report_id):
         report: BugReport = check_existing_bug_report_by_number(bug_report_id)
-        if not report.is_fixed and report.is_open:
-            report.is_fixed = True
-            report.is_open = False
-            db.session.commit()
+        if report is None:
+            return redirect(url_for('bugs'))
+        try:
+            fixed = fix_bug(report)
+        except StaleDataError:
+            return concurrent_change(bug_report_id)
+        if fixed:
             flash('Bug report marked as fixed', 'success')
-            for subscriber in report.subscribers:
-                send_email(subscriber.email, f"Bug report #{bug_report_id} is fixed", f"Please see the bug report below: \n\n{report.description}")
         else:
             flash('Bug report is already fixed or closed', 'error')
         return redirect(url_for('bugs') + "/" + str(bug_report_id))
 
+    def concurrent_change(number):
+        # The version column caught a commit from another request between loading the report and saving it.
+        db.session.rollback()
+        flash('Bug report was changed by someone else, please reload it and try again', 'error')
+        return redirect(url_for('bugs') + "/" + str(number))
+
+    @app.route('/bugs/batch', methods=['GET', 'POST'])
+    @login_required
+    def batch_transition():
+        form = BatchTransitionForm()
+        outcomes = None
+
+        if form.validate_on_submit():
+            numbers = parse_bug_numbers(form.bug_numbers.data)
+            if not numbers:
+                flash('Bug numbers must be whole numbers separated by commas or spaces', 'error')
+            elif len(numbers) > MAX_BATCH_SIZE:
+                flash(f'At most {MAX_BATCH_SIZE} bug reports can be changed at once', 'error')
+            else:
+                outcomes = transition_bugs(numbers, form.state.data, form.close_reason.data)
+                changed = sum(outcome == form.state.data for outcome in outcomes.values())
+                flash(f'{changed} of {len(outcomes)} bug reports marked as {form.state.data}', 'success')
+
+        return render_template('batch_transition.html', form=form, outcomes=outcomes)
+
     @app.route('/sprint', methods=['GET', 'POST'])
     @login_required
     def sprint():
@@ -250,11 +387,7 @@ def create_app(testing=False):
                     error = 'Sprint already exists!'
                     flash(error, 'error')
                 else:
-                    inserted_sprint = Sprint(start_date=form.start_date.data, end_date=form.end_date.data,
-                                             # Create sprint
-                                             name=form.sprint_name.data, bugs=[])
-                    db.session.add(inserted_sprint)  # Add to database
-                    db.session.commit()
+                    create_sprint(form.sprint_name.data, form.start_date.data, form.end_date.data)
                     flash("Sprint created succesfully!", 'success')
                 # Logic to process form submission
                 return redirect(url_for('sprint'))  # Redirect back to the bug report page after submission
@@ -267,37 +400,70 @@ def create_app(testing=False):
     @app.route('/sprint_statistics', methods=['GET'])
     @login_required
     def sprint_statistics():
-        sprints = Sprint.query.all()
-        sprints_sorted = sorted(sprints, key=lambda x: x.start_date, reverse=True)
-
-        sprint_names = [f"{sprint.name} ({sprint.start_date} - {sprint.end_date})" for sprint in sprints_sorted]
-        open_bug_counts = [len([bug for bug in sprint.bugs if bug.is_open]) for sprint in sprints_sorted]
-        fixed_bug_counts = [len([bug for bug in sprint.bugs if bug.is_fixed]) for sprint in sprints_sorted]
-        total_bug_counts = [len(sprint.bugs) for sprint in sprints_sorted]
+        chart_format = app.config['STATISTICS_CHART_FORMAT']
+        if chart_format not in CHART_FORMATS or (chart_format == 'png' and not png_charts_available()):
+            chart_format = 'svg'
+        return render_template('sprint_statistics.html', chart_format=chart_format)
 
-        fig = Figure()
-        ax = fig.add_subplot(111)
-        ax.bar(sprint_names, total_bug_counts, color='b', label='Total')
-        ax.bar(sprint_names, fixed_bug_counts, color='g', label='Fixed')
-        ax.bar(sprint_names, open_bug_counts, color='r', label='Open')
-
-        ax.set_xlabel('Number of Bug Reports')
-        ax.set_ylabel('Sprint Name')
-        ax.legend()
-
-        canvas = FigureCanvas(fig)
-        png_output = BytesIO()
-        canvas.print_png(png_output)
-
-        img_data = base64.b64encode(png_output.getvalue()).decode('utf-8')
-        return render_template('sprint_statistics.html', img_data=img_data)
+    @app.route('/sprint_statistics/chart.<chart_format>', methods=['GET'])
+    @login_required
+    def sprint_statistics_chart(chart_format):
+        if chart_format not in CHART_FORMATS or (chart_format == 'png' and not png_charts_available()):
+            abort(404)
+        version, updated_at = get_data_version()
+        etag = f'sprint-statistics-{chart_format}-{version}'
+        if cached := not_modified(etag, updated_at):
+            return cached
+
+        def render():
+            sprint_counts = get_sprint_bug_counts()
+            with timed('chart'):
+                return CHART_RENDERERS[chart_format](sprint_counts)
+
+        chart = get_chart_cache().get(f'sprint_statistics.{chart_format}', version, render)
+        response = make_response(chart)
+        response.mimetype = CHART_FORMATS[chart_format]
+        return conditional_response(response, etag, updated_at)
+
+    @app.route('/api/sprint_statistics', methods=['GET'])
+    @login_required
+    def api_sprint_statistics():
+        version, updated_at = get_data_version()
+        etag = f'sprint-statistics-json-{version}'
+        if cached := not_modified(etag, updated_at):
+            return cached
+        response = jsonify([{
+            'id': sprint.id,
+            'name': sprint.name,
+            'start_date': sprint.start_date.isoformat(),
+            'end_date': sprint.end_date.isoformat(),
+            'total': sprint.total,
+            'open': sprint.open,
+            'fixed': sprint.fixed,
+        } for sprint in get_sprint_bug_counts()])
+        return conditional_response(response, etag, updated_at)
+
+    def conditional_response(response, etag, last_modified):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def not_modified(etag, last_modified):
+        # Answers a revalidation from the data version alone, before any aggregate or chart is built.
+        response = conditional_response(make_response(''), etag, last_modified)
+        return response if response.status_code == 304 else None
 
     return app
 
 
 app = create_app()
-with app.app_context():
-    db.create_all()
 
 if __name__ == '__main__':
+    # Deployments run `flask --app app upgrade-db` as a release step; the development server upgrades on start.
+    with app.app_context():
+        upgrade_database()
+        ensure_duplicate_index()
+        get_duplicate_index()
     app.run()
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from duplicates import get_duplicate_index
+from models import db, ArchivedBugReport, BugReport, bug_report_subscribers
+from utilities import bump_data_version
+
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVED_COLUMNS = ('id', 'number', 'bug_type', 'description', 'is_open', 'is_fixed', 'reason_for_close', 'created',
+                    'resolved_at', 'user_id', 'sprint_id')
+
+
+def archivable_bug_report_ids(cutoff, limit):
+    # Reports closed before resolved_at existed fall back to their creation date.
+    return db.session.scalars(
+        db.select(BugReport.id).where(BugReport.is_open.is_(False),
+                                      db.func.coalesce(BugReport.resolved_at, BugReport.created) <= cutoff)
+        .order_by(BugReport.id).limit(limit)
+    ).all()
+
+
+def archive_batch(ids, now):
+    # Copy then delete in one transaction, so a report is always either live or archived; the sprint_stats triggers
+    # add it for the copy and subtract it for the delete, leaving the sprint's counts unchanged.
+    selected = db.select(*(getattr(BugReport, column) for column in ARCHIVED_COLUMNS),
+                         db.literal(now, db.DateTime()).label('archived_at')).where(BugReport.id.in_(ids))
+    db.session.execute(db.insert(ArchivedBugReport).from_select([*ARCHIVED_COLUMNS, 'archived_at'], selected))
+    db.session.execute(db.delete(bug_report_subscribers).where(bug_report_subscribers.c.bug_report_id.in_(ids)))
+    db.session.execute(db.delete(BugReport).where(BugReport.id.in_(ids)).execution_options(synchronize_session=False))
+    bump_data_version()
+    db.session.commit()
+    index = get_duplicate_index()
+    for bug_report_id in ids:
+        index.remove(bug_report_id)
+
+
+def archive_bug_reports(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    # Moves closed and fixed reports resolved more than older_than_days ago to archived_bug_report; returns how many.
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=older_than_days)
+    archived = 0
+    while ids := archivable_bug_report_ids(cutoff, batch_size):
+        archive_batch(ids, now)
+        archived += len(ids)
+    return archived
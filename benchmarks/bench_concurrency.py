@@ -0,0 +1,110 @@
+"""Read throughput of a file SQLite database while a writer commits continuously, default versus tuned pragmas.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_concurrency --readers 1 4 8 --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, insert, select
+
+from database import apply_sqlite_pragmas, engine_options, sqlite_pragmas
+from models import db, User, Sprint, BugReport
+
+
+def make_engine(path, tuned):
+    uri = f'sqlite:///{path}'
+    if not tuned:
+        return create_engine(uri)
+    engine = create_engine(uri, **engine_options(uri))
+    apply_sqlite_pragmas(engine, sqlite_pragmas())
+    return engine
+
+
+def seed(engine, size):
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{'username': 'bench', 'employee_id': '0', 'password': 'x',
+                                           'email': 'bench@example.com'}])
+        connection.execute(insert(Sprint), [{'name': 'Sprint', 'start_date': date(2024, 1, 1),
+                                             'end_date': date(2024, 12, 31)}])
+        connection.execute(insert(BugReport), [
+            {'number': i, 'bug_type': 'Type A', 'description': f'Bug {i}', 'is_open': True, 'is_fixed': False,
+             'reason_for_close': '', 'user_id': 1, 'sprint_id': 1} for i in range(size)])
+
+
+def run(engine, readers, seconds, size):
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    latencies = []
+    lock = threading.Lock()
+    page = select(BugReport.id, BugReport.number, BugReport.bug_type).order_by(BugReport.id.desc()).limit(50)
+
+    def read():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    connection.execute(page).all()
+            except Exception:
+                with lock:
+                    counts['errors'] += 1
+                continue
+            with lock:
+                counts['reads'] += 1
+                latencies.append(time.perf_counter() - start)
+
+    def write():
+        number = size
+        while not stop.is_set():
+            try:
+                with engine.begin() as connection:
+                    connection.execute(insert(BugReport), [
+                        {'number': number, 'bug_type': 'Type B', 'description': f'Bug {number}', 'is_open': True,
+                         'is_fixed': False, 'reason_for_close': '', 'user_id': 1, 'sprint_id': 1}])
+            except Exception:
+                with lock:
+                    counts['errors'] += 1
+                continue
+            number += 1
+            with lock:
+                counts['writes'] += 1
+
+    threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+    return counts['reads'] / seconds, counts['writes'] / seconds, p95, counts['errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--size', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'pragmas':>8} {'readers':>8} {'reads/s':>9} {'writes/s':>9} {'read p95 (ms)':>14} {'errors':>7}")
+    for tuned in (False, True):
+        for readers in args.readers:
+            with tempfile.TemporaryDirectory() as directory:
+                engine = make_engine(os.path.join(directory, 'bench.db'), tuned)
+                seed(engine, args.size)
+                reads, writes, p95, errors = run(engine, readers, args.seconds, args.size)
+                engine.dispose()
+            print(f"{'tuned' if tuned else 'default':>8} {readers:>8} {reads:>9.0f} {writes:>9.0f} {p95:>14.2f} "
+                  f"{errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
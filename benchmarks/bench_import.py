@@ -0,0 +1,85 @@
+"""Rows/sec of the bulk import pipeline versus one ORM insert and commit per report.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import --rows 200000
+"""
+import argparse
+import csv
+import io
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from bulk_import import BugReportImporter, read_rows
+from models import db, User, Sprint, BugReport
+from utilities import check_date_in_sprint
+
+FIRST_DAY = date(2020, 1, 1)
+SPRINTS = 100
+
+
+def source_rows(count, offset=0):
+    for i in range(offset, offset + count):
+        yield {'number': i, 'bug_type': 'Crash', 'description': f'Imported report {i} crashes on start',
+               'reporter': 'bench', 'created': (FIRST_DAY + timedelta(days=i % (SPRINTS * 14))).isoformat(),
+               'is_open': 'true', 'is_fixed': 'false'}
+
+
+def csv_source(count):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(next(source_rows(1))))
+    writer.writeheader()
+    writer.writerows(source_rows(count))
+    output.seek(0)
+    return output
+
+
+def seed():
+    db.session.add(User(username='bench', employee_id='0', password='x', email='bench@example.com'))
+    db.session.execute(insert(Sprint), [
+        {'name': f'Sprint {i}', 'start_date': FIRST_DAY + timedelta(days=14 * i),
+         'end_date': FIRST_DAY + timedelta(days=14 * i + 13)} for i in range(SPRINTS)])
+    db.session.commit()
+
+
+def per_row_import(rows):
+    # What loading through the bug_report form amounts to: a sprint query, an insert and a commit per row.
+    user_id = User.query.filter_by(username='bench').one().id
+    for row in rows:
+        created = date.fromisoformat(row['created'])
+        db.session.add(BugReport(number=row['number'], bug_type=row['bug_type'], description=row['description'],
+                                 is_open=True, is_fixed=False, reason_for_close='', user_id=user_id,
+                                 sprint_id=check_date_in_sprint(created).id))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--per-row-sample', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = create_app(testing=True)
+    with app.app_context():
+        db.create_all()
+        seed()
+        source = csv_source(args.rows)
+        start = time.perf_counter()
+        BugReportImporter(args.batch_size).run(read_rows(source, 'csv'))
+        bulk_rate = args.rows / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        per_row_import(source_rows(args.per_row_sample, offset=args.rows))
+        per_row_rate = args.per_row_sample / (time.perf_counter() - start)
+
+    print(f"{'pipeline':>22} {'rows':>9} {'rows/sec':>10}")
+    print(f"{'bulk import':>22} {args.rows:>9} {bulk_rate:>10.0f}")
+    print(f"{'per-row insert+commit':>22} {args.per_row_sample:>9} {per_row_rate:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
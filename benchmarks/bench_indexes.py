@@ -0,0 +1,76 @@
+"""Lookup latency of the sprint-date and sprint-status queries as the tables grow, with and without indexes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_indexes --sizes 1000 10000 100000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert, text
+
+from app import create_app
+from models import db, User, Sprint, BugReport
+from utilities import check_date_in_sprint
+
+INDEXES = ['ix_sprint_end_date_start_date', 'ix_bug_report_sprint_id_is_open_is_fixed',
+           'ix_bug_report_user_id', 'ix_bug_report_created']
+
+
+def seed(sprint_count, bug_count):
+    db.session.add(User(username='bench', employee_id='0', password='x', email='bench@example.com'))
+    first_day = date(2000, 1, 1)
+    db.session.execute(insert(Sprint), [
+        {'name': f'Sprint {i}', 'start_date': first_day + timedelta(days=14 * i),
+         'end_date': first_day + timedelta(days=14 * i + 13)} for i in range(sprint_count)])
+    db.session.execute(insert(BugReport), [
+        {'number': i, 'bug_type': 'Type', 'description': 'Description', 'is_open': i % 3 == 0,
+         'is_fixed': i % 3 == 1, 'reason_for_close': '', 'user_id': 1, 'sprint_id': i % sprint_count + 1}
+        for i in range(bug_count)])
+    db.session.commit()
+    return first_day + timedelta(days=14 * (sprint_count - 1))
+
+
+def time_per_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(size, repeat):
+    app = create_app(testing=True)
+    with app.app_context():
+        db.create_all()
+        last_sprint_day = seed(sprint_count=size, bug_count=size * 10)
+
+        def sprint_lookup():
+            check_date_in_sprint(last_sprint_day)
+
+        def status_count():
+            BugReport.query.filter_by(sprint_id=size // 2, is_open=True, is_fixed=False).count()
+
+        indexed = time_per_call(sprint_lookup, repeat), time_per_call(status_count, repeat)
+        for index in INDEXES:
+            db.session.execute(text(f'DROP INDEX {index}'))
+        unindexed = time_per_call(sprint_lookup, repeat), time_per_call(status_count, repeat)
+        db.session.remove()
+    return indexed, unindexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'sprints':>8} {'bugs':>9} | {'sprint lookup (us)':>26} | {'status count (us)':>26}")
+    print(f"{'':>8} {'':>9} | {'indexed':>12} {'no index':>13} | {'indexed':>12} {'no index':>13}")
+    for size in args.sizes:
+        (lookup, count), (lookup_scan, count_scan) = run(size, args.repeat)
+        print(f'{size:>8} {size * 10:>9} | {lookup:>12.1f} {lookup_scan:>13.1f} | {count:>12.1f} {count_scan:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
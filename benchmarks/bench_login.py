@@ -0,0 +1,84 @@
+"""Login throughput under concurrent sign-ins, and the latency of other requests meanwhile, per hash method and pool size.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_login --clients 16 --methods pbkdf2 scrypt --workers 1 2 4 --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+PASSWORD = 'bench-password'
+
+
+def run(method, workers, clients, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({'database_url': f'sqlite:///{os.path.join(directory, "bench.db")}',
+                           'notification_worker': 'false', 'password_hash_method': method,
+                           'password_hash_workers': str(workers), 'password_hash_max_pending': str(clients * 2),
+                           'password_hash_queue_timeout': '30'})
+        from app import create_app
+        from models import db, User
+        from utilities import hash_password
+
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            password = hash_password(PASSWORD)
+            db.session.add_all(User(username=f'user{i}', email=f'user{i}@example.com', employee_id=str(i),
+                                    password=password) for i in range(clients))
+            db.session.commit()
+
+        stop = threading.Event()
+        logins = [0] * clients
+        probe_latencies = []
+
+        def sign_in(index):
+            client = app.test_client()
+            while not stop.is_set():
+                response = client.post('/login', data={'username': f'user{index}', 'password': PASSWORD})
+                logins[index] += response.status_code == 302
+                client.get('/logout')
+
+        def probe():
+            client = app.test_client()
+            while not stop.is_set():
+                start = time.perf_counter()
+                client.get('/')
+                probe_latencies.append(time.perf_counter() - start)
+                time.sleep(0.01)
+
+        threads = [threading.Thread(target=sign_in, args=(index,)) for index in range(clients)]
+        threads.append(threading.Thread(target=probe))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+        probe_latencies.sort()
+        return sum(logins) / seconds, probe_latencies[int(len(probe_latencies) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--methods', nargs='+', default=['pbkdf2', 'scrypt'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'method':>24} {'workers':>8} {'logins/s':>9} {'other p95 (ms)':>15}")
+    for method in args.methods:
+        for workers in args.workers:
+            throughput, probe_p95 = run(method, workers, args.clients, args.seconds)
+            print(f'{method:>24} {workers:>8} {throughput:>9.1f} {probe_p95:>15.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Full-text search latency of the FTS5 index versus a LIKE scan as bug_report grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+import itertools
+import random
+import time
+
+from sqlalchemy import insert, text
+
+from app import create_app
+from models import db, User, Sprint, BugReport
+from search import search_bug_reports
+
+# Descriptions draw from a Zipf-distributed vocabulary, like natural text: a handful of words appear in a large
+# share of reports while most words are rare.
+WORDS = ('login page crash timeout button layout chart email password sprint report render export import '
+         'database slow error null pointer overflow cache session cookie token upload download font color '
+         'keyboard mouse scroll modal dialog menu search filter sort table column row').split()
+WORDS += [f'term{i}' for i in range(20000)]
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+QUERIES = {'most common': 'login', 'common': 'keyboard', 'two terms': 'crash timeout', 'rare': 'term15000'}
+
+
+def seed(size, batch=50000):
+    random_words = random.Random(406)
+    db.session.add(User(username='bench', employee_id='0', password='x', email='bench@example.com'))
+    db.session.add(Sprint(name='Sprint', start_date='2024-01-01', end_date='2024-12-31'))
+    for start in range(0, size, batch):
+        db.session.execute(insert(BugReport), [
+            {'number': i, 'bug_type': random_words.choice(WORDS[:10]), 'is_open': True, 'is_fixed': False,
+             'description': ' '.join(random_words.choices(WORDS, cum_weights=CUMULATIVE_WEIGHTS, k=20)),
+             'reason_for_close': '', 'user_id': 1, 'sprint_id': 1}
+            for i in range(start, min(start + batch, size))])
+        db.session.commit()
+
+
+def like_search(query, limit=50):
+    results = BugReport.query
+    for term in query.split():
+        results = results.filter(db.or_(BugReport.description.like(f'%{term}%'), BugReport.bug_type.like(f'%{term}%'),
+                                        BugReport.reason_for_close.like(f'%{term}%')))
+    return results.order_by(BugReport.number).limit(limit).all()
+
+
+def milliseconds(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'query':>12} {'fts5 (ms)':>10} {'like (ms)':>10} {'matches':>9} {'ranked':>7}")
+    for size in args.sizes:
+        app = create_app(testing=True)
+        with app.app_context():
+            db.create_all()
+            seed(size)
+            for name, query in QUERIES.items():
+                fts = milliseconds(lambda: search_bug_reports(query), args.repeat)
+                like = milliseconds(lambda: like_search(query), args.repeat)
+                matches = db.session.execute(
+                    text('SELECT count(*) FROM bug_report_fts WHERE bug_report_fts MATCH :match'), {'match': query}
+                ).scalar()
+                ranked = len(search_bug_reports(query, limit=size)[0])
+                print(f'{size:>9} {name:>12} {fts:>10.2f} {like:>10.2f} {matches:>9} {ranked:>7}')
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
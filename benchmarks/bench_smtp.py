@@ -0,0 +1,69 @@
+"""Per-message send_email versus batched send_emails against a local aiosmtpd server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_smtp --messages 200
+
+The local server speaks plain SMTP, so this only measures connection setup and EHLO; against a real server each
+avoided connection also saves a TLS handshake and a login.
+"""
+import argparse
+import os
+import socket
+import time
+
+from aiosmtpd.controller import Controller
+
+from utilities import send_email, send_emails
+
+
+class CountingHandler:
+    def __init__(self):
+        self.messages = 0
+        self.handshakes = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.handshakes += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return '250 Message accepted for delivery'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    args = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    os.environ.update({'smtp_server': '127.0.0.1', 'port': str(port), 'smtp_ssl': 'false',
+                       'sender_email': 'brs@example.com', 'password': ''})
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    messages = [(f'subscriber{i}@example.com', 'Bug report #1 is fixed', 'Please see the bug report below')
+                for i in range(args.messages)]
+    try:
+        start = time.perf_counter()
+        for receiver, subject, body in messages:
+            send_email(receiver, subject, body)
+        single_seconds, single_handshakes = time.perf_counter() - start, handler.handshakes
+
+        handler.handshakes = 0
+        start = time.perf_counter()
+        send_emails(messages)
+        batch_seconds, batch_handshakes = time.perf_counter() - start, handler.handshakes
+    finally:
+        controller.stop()
+
+    print(f"{'':>12} {'seconds':>9} {'msgs/sec':>10} {'handshakes':>11}")
+    print(f"{'send_email':>12} {single_seconds:>9.3f} {args.messages / single_seconds:>10.0f} {single_handshakes:>11}")
+    print(f"{'send_emails':>12} {batch_seconds:>9.3f} {args.messages / batch_seconds:>10.0f} {batch_handshakes:>11}")
+
+
+if __name__ == '__main__':
+    main()
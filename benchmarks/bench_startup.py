@@ -0,0 +1,47 @@
+"""Import time and resident memory of a worker importing app.py, with and without matplotlib loaded eagerly.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'eager':
+    import matplotlib.pyplot, matplotlib.figure, matplotlib.backends.backend_agg
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+'''
+
+
+def measure(mode, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE, mode], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return (statistics.median(sample['seconds'] for sample in samples),
+            statistics.median(sample['max_rss_kb'] for sample in samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    lazy_seconds, lazy_rss = measure('lazy', args.runs)
+    eager_seconds, eager_rss = measure('eager', args.runs)
+    print(f"{'':>20} {'import (ms)':>12} {'max RSS (MiB)':>14}")
+    print(f"{'eager matplotlib':>20} {eager_seconds * 1000:>12.0f} {eager_rss / 1024:>14.1f}")
+    print(f"{'lazy matplotlib':>20} {lazy_seconds * 1000:>12.0f} {lazy_rss / 1024:>14.1f}")
+    print(f"{'saved':>20} {(eager_seconds - lazy_seconds) * 1000:>12.0f} {(eager_rss - lazy_rss) / 1024:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
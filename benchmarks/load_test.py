@@ -0,0 +1,161 @@
+"""Latency percentiles and throughput of the main routes against a seeded database.
+
+Run from the repository root, saving the results and comparing them with an earlier run:
+
+    python -m benchmarks.load_test --bugs 100000 --output results/after.json --compare results/before.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from models import db, User, Sprint, BugReport, bug_report_subscribers
+from utilities import hash_password
+
+PASSWORD = 'bench-password'
+FIRST_SPRINT = date(2024, 1, 1)
+SPRINT_DAYS = 14
+
+
+def seed(users, sprints, bugs, subscriptions, batch=50000):
+    rng = random.Random(406)
+    password = hash_password(PASSWORD)
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'employee_id': str(i), 'password': password}
+        for i in range(1, users + 1)])
+    db.session.execute(insert(Sprint), [
+        {'name': f'Sprint {i}', 'start_date': FIRST_SPRINT + timedelta(days=SPRINT_DAYS * (i - 1)),
+         'end_date': FIRST_SPRINT + timedelta(days=SPRINT_DAYS * i - 1)}
+        for i in range(1, sprints + 1)])
+    for start in range(1, bugs + 1, batch):
+        numbers = range(start, min(start + batch, bugs + 1))
+        db.session.execute(insert(BugReport), [
+            {'number': number, 'bug_type': f'Type {rng.randint(1, 10)}',
+             'description': f'Bug {number} in component {rng.randint(1, 500)}', 'is_open': rng.random() < 0.6,
+             'is_fixed': rng.random() < 0.5, 'reason_for_close': '', 'user_id': rng.randint(1, users),
+             'sprint_id': rng.randint(1, sprints)}
+            for number in numbers])
+        links = {(number, rng.randint(1, users)) for number in numbers for _ in range(subscriptions)}
+        if links:
+            db.session.execute(insert(bug_report_subscribers), [
+                {'bug_report_id': number, 'user_id': user_id} for number, user_id in links])
+        db.session.commit()
+
+
+def scenarios(client, bugs, sprints):
+    rng = random.Random(407)
+    new_numbers = iter(range(bugs + 1, sys.maxsize))
+    last_day = SPRINT_DAYS * sprints - 1
+    return {
+        'login': lambda: client.post('/login', data={'username': f'user{rng.randint(1, 10)}', 'password': PASSWORD}),
+        'bugs': lambda: client.get('/bugs'),
+        'bug_detail': lambda: client.get(f'/bugs/{rng.randint(1, bugs)}'),
+        'bug_report_post': lambda: client.post('/bug_report', data={
+            'report_number': next(new_numbers), 'bug_type': 'Type 1', 'bug_summary': 'Load test bug report',
+            'current_date': (FIRST_SPRINT + timedelta(days=rng.randint(0, last_day))).isoformat()}),
+        'sprint_statistics': lambda: client.get('/sprint_statistics'),
+        'sprint_statistics_chart': lambda: client.get('/sprint_statistics/chart.svg'),
+    }
+
+
+def percentile(sorted_samples, percent):
+    # Nearest-rank percentile.
+    return sorted_samples[max(0, -(-len(sorted_samples) * percent // 100) - 1)]
+
+
+def run_scenario(request, requests, warmup):
+    for _ in range(warmup):
+        request()
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = request()
+        samples.append((time.perf_counter() - start) * 1000)
+        errors += response.status_code >= 400
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {'requests': requests, 'errors': errors, 'mean_ms': sum(samples) / requests,
+            'p50_ms': percentile(samples, 50), 'p95_ms': percentile(samples, 95), 'p99_ms': percentile(samples, 99),
+            'throughput_rps': requests / elapsed}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Returns the scenarios whose p95 got more than threshold percent slower than in the baseline.
+    print(f"\n{'scenario':>24} {'p95 before':>11} {'p95 after':>10} {'change':>8}")
+    regressions = []
+    for name, result in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        print(f"{name:>24} {before['p95_ms']:>11.2f} {result['p95_ms']:>10.2f} {change:>+7.1f}%")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--sprints', type=int, default=50)
+    parser.add_argument('--bugs', type=int, default=10000)
+    parser.add_argument('--subscriptions', type=int, default=2, help='subscribers per bug report')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--scenarios', nargs='+', help='only run these scenarios')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare p95 latencies with')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='exit with status 1 if a p95 latency regressed by more than this percentage')
+    args = parser.parse_args()
+
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        seed(args.users, args.sprints, args.bugs, args.subscriptions)
+        client = app.test_client()
+        client.post('/login', data={'username': 'user1', 'password': PASSWORD})
+        results = {'commit': git_commit(), 'python': platform.python_version(), 'created': time.time(),
+                   'volumes': {'users': args.users, 'sprints': args.sprints, 'bugs': args.bugs,
+                               'subscriptions': args.subscriptions},
+                   'scenarios': {}}
+        print(f"{'scenario':>24} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'req/s':>8} {'errors':>7}")
+        for name, request in scenarios(client, args.bugs, args.sprints).items():
+            if args.scenarios and name not in args.scenarios:
+                continue
+            result = results['scenarios'][name] = run_scenario(request, args.requests, args.warmup)
+            print(f"{name:>24} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                  f"{result['throughput_rps']:>8.1f} {result['errors']:>7}")
+        db.session.remove()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold)
+        if regressions:
+            print(f"p95 regressed by more than {args.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
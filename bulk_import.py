@@ -0,0 +1,131 @@
+import csv
+import json
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from models import db, ArchivedBugReport, BugReport, User
+from sprint_index import SprintIntervalIndex
+from utilities import bump_data_version
+
+IMPORT_BATCH_SIZE = 5000
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 't')
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def parse_bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_created(value):
+    if not value:
+        return datetime.utcnow()
+    return datetime.fromisoformat(value)
+
+
+class BugReportImporter:
+    """Streams bug report rows into bug_report with one executemany INSERT and one commit per batch.
+
+    Reporters are resolved from a preloaded username -> id map and sprints from an interval index built once up
+    front (memoised per day), so no row costs a lookup query.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.imported = 0
+        self.skipped = Counter()
+        self.user_ids = dict(db.session.execute(db.select(User.username, User.id)).all())
+        self.known_user_ids = set(self.user_ids.values())
+        self.sprint_index = SprintIntervalIndex()
+        self.sprint_ids = {sprint_id for _, _, sprint_id in self.sprint_index.load()[1]}
+        self.sprint_by_day = {}
+
+    def sprint_id_for(self, created):
+        day = created.date()
+        if day not in self.sprint_by_day:
+            self.sprint_by_day[day] = self.sprint_index.lookup(day)
+        return self.sprint_by_day[day]
+
+    def convert(self, row):
+        try:
+            number = int(row['number'])
+            created = parse_created(row.get('created'))
+            resolved_at = datetime.fromisoformat(row['resolved_at']) if row.get('resolved_at') else None
+            user_id = int(row['user_id']) if row.get('user_id') and not row.get('reporter') else None
+            sprint_id = int(row['sprint_id']) if row.get('sprint_id') else None
+        except (KeyError, TypeError, ValueError):
+            return None, 'invalid number, id or date'
+        if not row.get('bug_type') or not row.get('description'):
+            return None, 'missing bug_type or description'
+        # Ids are checked against the preloaded users and sprints, so a bad row is skipped instead of failing the
+        # foreign key after earlier batches have committed.
+        if row.get('reporter'):
+            user_id = self.user_ids.get(row['reporter'])
+        if user_id not in self.known_user_ids:
+            return None, 'unknown reporter'
+        if sprint_id is None:
+            sprint_id = self.sprint_id_for(created)
+            if sprint_id is None:
+                return None, 'no sprint for created date'
+        elif sprint_id not in self.sprint_ids:
+            return None, 'unknown sprint'
+        is_fixed = parse_bool(row.get('is_fixed'), False)
+        return {
+            'number': number,
+            'bug_type': row['bug_type'],
+            'description': row['description'],
+            'is_open': parse_bool(row.get('is_open'), not is_fixed),
+            'is_fixed': is_fixed,
+            'reason_for_close': row.get('reason_for_close') or '',
+            'created': created,
+            'resolved_at': resolved_at,
+            'user_id': user_id,
+            'sprint_id': sprint_id,
+        }, None
+
+    def import_batch(self, rows):
+        converted = {}
+        for row in rows:
+            values, error = self.convert(row)
+            if error:
+                self.skipped[error] += 1
+            elif values['number'] in converted:
+                self.skipped['duplicate number'] += 1
+            else:
+                converted[values['number']] = values
+        existing = set(db.session.scalars(db.union(
+            db.select(BugReport.number).where(BugReport.number.in_(converted)),
+            db.select(ArchivedBugReport.number).where(ArchivedBugReport.number.in_(converted)))))
+        if existing:
+            self.skipped['duplicate number'] += len(existing)
+        values = [row for number, row in converted.items() if number not in existing]
+        if values:
+            db.session.execute(db.insert(BugReport), values)
+            db.session.commit()
+        self.imported += len(values)
+
+    def run(self, rows):
+        for batch in chunked(rows, self.batch_size):
+            self.import_batch(batch)
+        if self.imported:
+            bump_data_version()
+            db.session.commit()
+        return self.imported
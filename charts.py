@@ -0,0 +1,100 @@
+import importlib.util
+import threading
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from flask import current_app
+
+CHART_FORMATS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+BAR_COLORS = (('total', 'Total', 'blue'), ('fixed', 'Fixed', 'green'), ('open', 'Open', 'red'))
+
+
+def png_charts_available():
+    return importlib.util.find_spec('matplotlib') is not None
+
+
+def render_sprint_statistics_svg(sprint_counts):
+    # Same layout as the matplotlib chart (overlaid total/fixed/open bars per sprint) without importing matplotlib.
+    bar_width, gap, left, top, plot_height, label_height = 40, 30, 50, 40, 240, 120
+    width = left + max(len(sprint_counts), 1) * (bar_width + gap) + gap
+    height = top + plot_height + label_height
+    highest = max([sprint.total for sprint in sprint_counts] + [1])
+    baseline = top + plot_height
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="11">',
+             f'<line x1="{left}" y1="{top}" x2="{left}" y2="{baseline}" stroke="black"/>',
+             f'<line x1="{left}" y1="{baseline}" x2="{width}" y2="{baseline}" stroke="black"/>',
+             f'<text x="{left - 6}" y="{top + 4}" text-anchor="end">{highest}</text>',
+             f'<text x="{left - 6}" y="{baseline + 4}" text-anchor="end">0</text>',
+             f'<text x="12" y="{baseline - plot_height / 2}" text-anchor="middle" '
+             f'transform="rotate(-90 12 {baseline - plot_height / 2})">Number of Bug Reports</text>']
+    for position, sprint in enumerate(sprint_counts):
+        x = left + gap + position * (bar_width + gap)
+        for field, label, color in BAR_COLORS:
+            bar_height = getattr(sprint, field) / highest * plot_height
+            parts.append(f'<rect x="{x}" y="{baseline - bar_height:.1f}" width="{bar_width}" '
+                         f'height="{bar_height:.1f}" fill="{color}"><title>{label}: {getattr(sprint, field)}'
+                         f'</title></rect>')
+        name = escape(f"{sprint.name} ({sprint.start_date} - {sprint.end_date})")
+        label_x = x + bar_width / 2
+        parts.append(f'<text x="{label_x}" y="{baseline + 12}" text-anchor="end" '
+                     f'transform="rotate(-45 {label_x} {baseline + 12})">{name}</text>')
+    for position, (_, label, color) in enumerate(BAR_COLORS):
+        x = left + 10 + position * 70
+        parts.append(f'<rect x="{x}" y="10" width="10" height="10" fill="{color}"/>'
+                     f'<text x="{x + 14}" y="19">{label}</text>')
+    parts.append('</svg>')
+    return ''.join(parts).encode('utf-8')
+
+
+def render_sprint_statistics_png(sprint_counts):
+    # matplotlib is optional and costly to import, so it is only loaded the first time a PNG is rendered.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
+    sprint_names = [f"{sprint.name} ({sprint.start_date} - {sprint.end_date})" for sprint in sprint_counts]
+    open_bug_counts = [sprint.open for sprint in sprint_counts]
+    fixed_bug_counts = [sprint.fixed for sprint in sprint_counts]
+    total_bug_counts = [sprint.total for sprint in sprint_counts]
+
+    fig = Figure()
+    ax = fig.add_subplot(111)
+    ax.bar(sprint_names, total_bug_counts, color='b', label='Total')
+    ax.bar(sprint_names, fixed_bug_counts, color='g', label='Fixed')
+    ax.bar(sprint_names, open_bug_counts, color='r', label='Open')
+
+    ax.set_xlabel('Number of Bug Reports')
+    ax.set_ylabel('Sprint Name')
+    ax.legend()
+
+    canvas = FigureCanvas(fig)
+    png_output = BytesIO()
+    canvas.print_png(png_output)
+    return png_output.getvalue()
+
+
+class ChartCache:
+    """Keeps the most recently rendered chart per name, tagged with the data version it was rendered from."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._charts = {}
+
+    def get(self, name, version, render):
+        cached = self._charts.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._lock:
+            cached = self._charts.get(name)
+            if cached is None or cached[0] != version:
+                cached = (version, render())
+                self._charts[name] = cached
+        return cached[1]
+
+
+CHART_RENDERERS = {'svg': render_sprint_statistics_svg, 'png': render_sprint_statistics_png}
+
+
+def get_chart_cache():
+    return current_app.extensions.setdefault('chart_cache', ChartCache())
@@ -0,0 +1,121 @@
+import csv
+import os
+import time
+
+import click
+
+from archive import ARCHIVE_BATCH_SIZE, archive_bug_reports
+from bulk_import import BugReportImporter, IMPORT_BATCH_SIZE, read_rows
+from duplicates import DuplicateIndex, ensure_duplicate_index, rebuild_duplicate_index
+from migrations import upgrade_database
+from models import db
+from notifications import drain_outbox
+from passwords import PasswordHasher
+from provisioning import PROVISION_BATCH_SIZE, UserProvisioner
+from sprint_stats import check_sprint_stats, rebuild_sprint_stats
+
+
+def register_commands(app):
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Create missing tables, columns and indexes in the configured database."""
+        changes = upgrade_database()
+        if ensure_duplicate_index():
+            changes.append('duplicate index')
+        for change in changes:
+            click.echo(f'Added {change}')
+        click.echo('Database is up to date')
+
+    @app.cli.command('drain-outbox')
+    def drain_outbox_command():
+        """Deliver every queued email that is due, e.g. from cron when the in-process worker is disabled."""
+        delivered = 0
+        while batch := drain_outbox():
+            delivered += batch
+        click.echo(f'Processed {delivered} queued emails')
+
+    @app.cli.command('rebuild-duplicate-index')
+    def rebuild_duplicate_index_command():
+        """Recompute the MinHash signatures of every bug report and rewrite the duplicate index file."""
+        index = DuplicateIndex(app.config['DUPLICATE_INDEX_PATH'])
+        indexed = rebuild_duplicate_index(index)
+        app.extensions['duplicate_index'] = index
+        click.echo(f'Indexed {indexed} bug reports')
+
+    @app.cli.command('import-bugs')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+                  help='Input format, guessed from the file extension by default.')
+    @click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows per INSERT and commit.')
+    def import_bugs_command(source, file_format, batch_size):
+        """Bulk-load bug reports from a CSV or JSON lines file.
+
+        Columns: number, bug_type, description, reporter (username) or user_id, and optionally created (ISO date),
+        sprint_id, is_open, is_fixed, reason_for_close and resolved_at (ISO date). Rows without sprint_id go to the
+        sprint covering created.
+        """
+        file_format = file_format or ('csv' if source.name.endswith('.csv') else 'jsonl')
+        importer = BugReportImporter(batch_size)
+        start = time.perf_counter()
+        importer.run(read_rows(source, file_format))
+        elapsed = time.perf_counter() - start
+        click.echo(f'Imported {importer.imported} bug reports in {elapsed:.1f}s '
+                   f'({importer.imported / max(elapsed, 1e-9):.0f} rows/sec)')
+        for reason, count in importer.skipped.items():
+            click.echo(f'Skipped {count} rows: {reason}')
+        if importer.imported:
+            click.echo('Run rebuild-duplicate-index to add the imported reports to duplicate detection')
+
+    @app.cli.command('provision-users')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--credentials', type=click.File('w', encoding='utf-8'),
+                  help='CSV file receiving username, email and the generated password of rows without a password.')
+    @click.option('--batch-size', default=PROVISION_BATCH_SIZE, show_default=True, help='Users per INSERT and commit.')
+    @click.option('--hash-workers', default=os.cpu_count() or 1, show_default=True,
+                  help='Threads hashing passwords in parallel.')
+    def provision_users_command(source, credentials, batch_size, hash_workers):
+        """Create user accounts in bulk from an HR CSV export.
+
+        Columns: username, employee_id, email and optionally password. Rows that clash with an existing account or an
+        earlier row are skipped and counted.
+        """
+        on_credentials = None
+        if credentials is not None:
+            writer = csv.writer(credentials)
+            writer.writerow(['username', 'email', 'password'])
+            on_credentials = writer.writerow
+        hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], hash_workers, hash_workers, None)
+        provisioner = UserProvisioner(hasher, batch_size, on_credentials)
+        start = time.perf_counter()
+        provisioner.run(csv.DictReader(source))
+        elapsed = time.perf_counter() - start
+        click.echo(f'Provisioned {provisioner.provisioned} users in {elapsed:.1f}s')
+        for reason, count in provisioner.skipped.items():
+            click.echo(f'Skipped {count} rows: {reason}')
+
+    @app.cli.command('archive-bugs')
+    @click.option('--older-than-days', type=int, help='Retention age in days; defaults to archive_after_days.')
+    @click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True, help='Reports moved per transaction.')
+    def archive_bugs_command(older_than_days, batch_size):
+        """Move closed and fixed bug reports resolved longer ago than the retention age to the archive table."""
+        if older_than_days is None:
+            older_than_days = app.config['ARCHIVE_AFTER_DAYS']
+        archived = archive_bug_reports(older_than_days, batch_size)
+        click.echo(f'Archived {archived} bug reports resolved more than {older_than_days} days ago')
+
+    @app.cli.command('check-sprint-stats')
+    @click.option('--repair', is_flag=True, help='Recount every sprint from the report tables if any counter is off.')
+    def check_sprint_stats_command(repair):
+        """Compare the sprint_stats counters with a full count of the live and archived bug reports."""
+        mismatches = check_sprint_stats()
+        for sprint_id, (stored, actual) in sorted(mismatches.items()):
+            click.echo(f'Sprint {sprint_id}: stored total/open/fixed {stored}, actual {actual}')
+        if not mismatches:
+            click.echo('Sprint statistics are consistent')
+        elif repair:
+            db.session.rollback()
+            with db.engine.begin() as connection:
+                rebuild_sprint_stats(connection)
+            click.echo(f'Rebuilt sprint statistics; {len(mismatches)} sprints were off')
+        else:
+            raise click.ClickException(f'{len(mismatches)} sprints have drifted; rerun with --repair to rebuild')
@@ -0,0 +1,59 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def sqlite_pragmas():
+    # WAL lets readers keep reading while a writer commits; with it, synchronous=NORMAL is still crash-safe and only
+    # syncs at checkpoints. The busy timeout makes a second writer wait for the lock instead of failing immediately.
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('sqlite_busy_timeout_ms', 5000)),
+        'mmap_size': int(os.getenv('sqlite_mmap_size', 256 * 1024 * 1024)),
+        'cache_size': -int(os.getenv('sqlite_cache_size_kb', 16 * 1024)),
+    }
+
+
+def is_file_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def database_url(default):
+    # Hosting providers commonly hand out postgres:// URLs, which SQLAlchemy only accepts as postgresql://.
+    url = os.getenv('database_url') or default
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(uri):
+    # In-memory SQLite keeps Flask-SQLAlchemy's single shared connection; other databases get a pool sized for a
+    # threaded worker so each request thread has its own connection.
+    if make_url(uri).get_backend_name() == 'sqlite' and not is_file_sqlite(uri):
+        return {}
+    options = {
+        'pool_size': int(os.getenv('db_pool_size', 10)),
+        'max_overflow': int(os.getenv('db_max_overflow', 10)),
+        'pool_timeout': int(os.getenv('db_pool_timeout', 30)),
+    }
+    if not is_file_sqlite(uri):
+        # A server may close idle connections (restarts, failovers, idle timeouts), so test each one on checkout and
+        # retire it before the server would.
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = int(os.getenv('db_pool_recycle', 1800))
+    return options
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
@@ -0,0 +1,240 @@
+import base64
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import zlib
+from array import array
+
+from flask import current_app
+
+from models import db, BugReport
+
+# 64 MinHash permutations split into 16 bands of 4 rows: two descriptions land in a shared bucket with probability
+# 1 - (1 - J^4)^16 for Jaccard similarity J, i.e. ~50% at J=0.5 and >99% at J=0.8.
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+# Only the low 32 bits of each MinHash value are kept (b-bit MinHash): two different values agree on them with
+# probability 2^-32, and a signature fits in a 256 byte array instead of a tuple of 64 ints.
+SIGNATURE_MASK = 0xFFFFFFFF
+SHINGLE_SIZE = 5
+SIMILARITY_THRESHOLD = 0.5
+MERSENNE_PRIME = (1 << 61) - 1
+_permutation_random = random.Random(406)
+PERMUTATIONS = [(_permutation_random.randrange(1, MERSENNE_PRIME), _permutation_random.randrange(MERSENNE_PRIME))
+                for _ in range(NUM_PERMUTATIONS)]
+
+
+def shingles(text):
+    text = re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', (text or '').lower())).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)]
+    return array('I', (min((a * value + b) % MERSENNE_PRIME for value in hashes) & SIGNATURE_MASK
+                       for a, b in PERMUTATIONS))
+
+
+def band_keys(signature):
+    # Each band's rows packed into one int, prefixed with the band number so equal rows in different bands differ.
+    data = signature.tobytes()
+    width = ROWS_PER_BAND * signature.itemsize
+    return [(band << (8 * width)) | int.from_bytes(data[band * width:(band + 1) * width], 'little')
+            for band in range(BANDS)]
+
+
+def encode_signature(signature):
+    return base64.b64encode(signature.tobytes()).decode('ascii')
+
+
+def decode_signature(value):
+    if isinstance(value, list):
+        # Logs written before signatures were truncated to 32 bits stored the full values.
+        return array('I', (item & SIGNATURE_MASK for item in value))
+    signature = array('I')
+    signature.frombytes(base64.b64decode(value))
+    return signature
+
+
+def estimated_similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / NUM_PERMUTATIONS
+
+
+class DuplicateIndex:
+    """MinHash/LSH index of bug report descriptions keyed by BugReport.id.
+
+    Signatures are persisted as an append-only JSON lines log (one entry per add or removal, the signature base64
+    encoded) shared by every worker process and compacted by rebuild(); the LSH buckets are derived from the
+    signatures in memory. refresh() replays whatever other processes appended since the last read.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.signatures = {}
+        # Most buckets hold a single report, stored as its bare id; a set only once a second report shares it.
+        self.buckets = {}
+        self._lock = threading.Lock()
+        # (generation, bytes replayed, (inode, size) when last read) of the log.
+        self._log_position = (None, 0, None)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _insert(self, bug_report_id, signature):
+        self._discard(bug_report_id)
+        self.signatures[bug_report_id] = signature
+        for key in band_keys(signature):
+            members = self.buckets.setdefault(key, bug_report_id)
+            if isinstance(members, set):
+                members.add(bug_report_id)
+            elif members != bug_report_id:
+                self.buckets[key] = {members, bug_report_id}
+
+    def _discard(self, bug_report_id):
+        signature = self.signatures.pop(bug_report_id, None)
+        if signature is not None:
+            for key in band_keys(signature):
+                members = self.buckets.get(key)
+                if isinstance(members, set):
+                    members.discard(bug_report_id)
+                    if len(members) == 1:
+                        self.buckets[key] = members.pop()
+                elif members == bug_report_id:
+                    del self.buckets[key]
+
+    def _append_log(self, entry):
+        # Until rebuild() has written the log there is nothing to append to; the rebuild reads the table anyway.
+        if self.path is None:
+            return
+        try:
+            descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            return
+        with os.fdopen(descriptor, 'w') as log:
+            log.write(json.dumps(entry) + '\n')
+
+    def add(self, bug_report_id, description):
+        signature = minhash(description)
+        with self._lock:
+            self._insert(bug_report_id, signature)
+            self._append_log({'id': bug_report_id, 'signature': encode_signature(signature)})
+
+    def remove(self, bug_report_id):
+        with self._lock:
+            self._discard(bug_report_id)
+            self._append_log({'id': bug_report_id, 'removed': True})
+
+    def candidates(self, description, threshold=SIMILARITY_THRESHOLD, limit=5, exclude=None):
+        # Only reports sharing at least one band bucket are compared, instead of every report in the table.
+        self.refresh()
+        signature = minhash(description)
+        with self._lock:
+            ids = set()
+            for key in band_keys(signature):
+                members = self.buckets.get(key)
+                if isinstance(members, set):
+                    ids.update(members)
+                elif members is not None:
+                    ids.add(members)
+            ids.discard(exclude)
+            scored = [(bug_report_id, estimated_similarity(signature, self.signatures[bug_report_id]))
+                      for bug_report_id in ids]
+        scored = [match for match in scored if match[1] >= threshold]
+        return sorted(scored, key=lambda match: (-match[1], match[0]))[:limit]
+
+    def refresh(self):
+        if self.path is None:
+            return
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            generation, offset, seen = self._log_position
+            if (status.st_ino, status.st_size) == seen:
+                return
+            with open(self.path, 'rb') as log:
+                header = log.readline()
+                header_entry = json.loads(header) if header.endswith(b'\n') else {}
+                if header_entry.get('generation') != generation or offset == 0:
+                    # First read, or rebuild() has swapped in a new log: start over from its first entry.
+                    self.signatures.clear()
+                    self.buckets.clear()
+                    generation = header_entry.get('generation')
+                    offset = len(header) if generation else 0
+                log.seek(offset)
+                # A line still being written by another process is left for the next refresh.
+                data = log.read()
+                data = data[:data.rfind(b'\n') + 1]
+            for line in data.splitlines():
+                entry = json.loads(line)
+                if entry.get('removed'):
+                    self._discard(entry['id'])
+                else:
+                    self._insert(entry['id'], decode_signature(entry['signature']))
+            self._log_position = (generation, offset + len(data), (status.st_ino, status.st_size))
+
+    def rebuild(self, rows):
+        # rows are (id, description) pairs; the log is rewritten in full and swapped in atomically. Its first line
+        # names the generation, so other processes notice the swap and reread it.
+        signatures = {bug_report_id: minhash(description) for bug_report_id, description in rows}
+        with self._lock:
+            self.signatures.clear()
+            self.buckets.clear()
+            for bug_report_id, signature in signatures.items():
+                self._insert(bug_report_id, signature)
+            if self.path is not None:
+                generation = secrets.token_hex(8)
+                temporary_path = self.path + '.tmp'
+                with open(temporary_path, 'w') as log:
+                    log.write(json.dumps({'generation': generation}) + '\n')
+                    for bug_report_id, signature in signatures.items():
+                        log.write(json.dumps({'id': bug_report_id, 'signature': encode_signature(signature)}) + '\n')
+                    size = log.tell()
+                os.replace(temporary_path, self.path)
+                self._log_position = (generation, size, (os.stat(self.path).st_ino, size))
+
+
+def rebuild_duplicate_index(index, batch_size=10000):
+    rows = db.session.execute(db.select(BugReport.id, BugReport.description).execution_options(yield_per=batch_size))
+    index.rebuild(rows)
+    return len(index)
+
+
+def ensure_duplicate_index():
+    # Run at release time (upgrade-db), never inside a request: builds the log from the table if there is none yet.
+    path = current_app.config.get('DUPLICATE_INDEX_PATH')
+    if path is None or os.path.exists(path):
+        return False
+    rebuild_duplicate_index(DuplicateIndex(path))
+    return True
+
+
+def get_duplicate_index():
+    index = current_app.extensions.get('duplicate_index')
+    if index is None:
+        index = DuplicateIndex(current_app.config.get('DUPLICATE_INDEX_PATH'))
+        if index.path is None:
+            # Without a log (tests) the index is private to this process and can only be built from the table.
+            rebuild_duplicate_index(index)
+        else:
+            index.refresh()
+        index = current_app.extensions.setdefault('duplicate_index', index)
+    return index
+
+
+def find_duplicate_bug_reports(description, exclude=None, limit=5):
+    # Returns (number, similarity) pairs for the most similar existing reports.
+    matches = get_duplicate_index().candidates(description, limit=limit, exclude=exclude)
+    if not matches:
+        return []
+    numbers = dict(db.session.execute(
+        db.select(BugReport.id, BugReport.number).where(BugReport.id.in_([match[0] for match in matches]))
+    ).all())
+    return [(numbers[bug_report_id], similarity) for bug_report_id, similarity in matches if bug_report_id in numbers]
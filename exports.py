@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+
+from models import db, BugReport, ArchivedBugReport
+from utilities import filter_bug_reports
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_COLUMNS = (BugReport.number, BugReport.bug_type, BugReport.description, BugReport.is_open, BugReport.is_fixed,
+                  BugReport.reason_for_close, BugReport.created, BugReport.user_id, BugReport.sprint_id)
+EXPORT_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_rows(filters, include_archived=False, batch_size=EXPORT_BATCH_SIZE):
+    # yield_per streams rows off the cursor in batches instead of materialising the whole result set.
+    query = filter_bug_reports(db.session.query(*EXPORT_COLUMNS), **filters)
+    if include_archived:
+        archived_columns = (getattr(ArchivedBugReport, field) for field in EXPORT_FIELDS)
+        query = query.union_all(filter_bug_reports(db.session.query(*archived_columns), model=ArchivedBugReport,
+                                                   **filters))
+    return query.order_by(BugReport.number).yield_per(batch_size)
+
+
+def export_batches(rows, batch_size=EXPORT_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_csv(filters, include_archived=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in export_batches(export_rows(filters, include_archived)):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_ndjson(filters, include_archived=False):
+    for batch in export_batches(export_rows(filters, include_archived)):
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + '\n' for row in batch)
+
+
+EXPORT_GENERATORS = {'csv': generate_csv, 'ndjson': generate_ndjson}
@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, DateField, TextAreaField, validators
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, DateField, TextAreaField, SelectField, \
+    validators
 from wtforms.fields.simple import HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Optional
 
@@ -41,4 +42,16 @@ class ChangePasswordForm(FlaskForm):
     current_password = PasswordField('Current Password', validators=[validators.DataRequired()])
     new_password = PasswordField('New Password', validators=[validators.DataRequired()])
     confirm_password = PasswordField('Confirm Password', validators=[validators.DataRequired(), validators.EqualTo('new_password', message='Passwords must match')])
-    submit = SubmitField('Change Password')
\ No newline at end of file
+    submit = SubmitField('Change Password')
+
+
+class NotificationSettingsForm(FlaskForm):
+    digest_notifications = BooleanField('Send me one digest email instead of an email per bug report update')
+    submit = SubmitField('Save Settings')
+
+
+class BatchTransitionForm(FlaskForm):
+    bug_numbers = TextAreaField('Bug Numbers', validators=[DataRequired()])
+    state = SelectField('New State', choices=[('closed', 'Closed'), ('fixed', 'Fixed')])
+    close_reason = TextAreaField('Reason for Closing')
+    submit = SubmitField('Apply')
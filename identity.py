@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+
+from models import db, User
+
+IDENTITY_CACHE_SIZE = 10000
+IDENTITY_CACHE_TTL_SECONDS = 300
+
+
+class CachedUser(UserMixin):
+    """Detached snapshot of the User fields requests read, without the password hash.
+
+    Routes that change the user load the real User by id instead and invalidate the cache entry.
+    """
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.digest_notifications = user.digest_notifications
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class IdentityCache:
+    """Process-local LRU of CachedUser by id; entries expire after ttl seconds so other workers' changes show up."""
+
+    def __init__(self, maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (self.clock() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_identity_cache():
+    return current_app.extensions.setdefault('identity_cache', IdentityCache(
+        current_app.config['IDENTITY_CACHE_SIZE'], current_app.config['IDENTITY_CACHE_TTL']))
+
+
+def load_cached_user(user_id):
+    cache = get_identity_cache()
+    user = cache.get(user_id)
+    if user is None:
+        db_user = db.session.get(User, user_id)
+        if db_user is None:
+            return None
+        user = CachedUser(db_user)
+        cache.put(user_id, user)
+    return user
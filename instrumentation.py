@@ -0,0 +1,308 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request, \
+    before_render_template, template_rendered
+from sqlalchemy import event
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PROFILE_INTERVAL_SECONDS = 0.005
+METRICS_FLUSH_INTERVAL_SECONDS = 5
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label value."""
+
+    def __init__(self, name, documentation, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self, label_value):
+        series = self._series.get(label_value)
+        return series[1] if series else 0
+
+    def snapshot(self):
+        with self._lock:
+            return {label_value: [list(bucket_counts), count, total]
+                    for label_value, (bucket_counts, count, total) in self._series.items()}
+
+    def exposition(self, snapshots=None):
+        # snapshots are other processes' snapshot() results to add to this one's series.
+        series = self.snapshot()
+        for snapshot in snapshots or ():
+            for label_value, (bucket_counts, count, total) in snapshot.items():
+                merged = series.setdefault(label_value, [[0] * len(self.buckets), 0, 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], bucket_counts)]
+                merged[1] += count
+                merged[2] += total
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_value, (bucket_counts, count, total) in sorted(series.items()):
+            label = f'{self.label}="{escape_label(label_value)}"'
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.sections = Counter()
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram('brs_request_duration_seconds', 'Wall time spent handling a request.',
+                                         'endpoint')
+        self.sql_queries = Histogram('brs_request_sql_queries', 'SQL statements executed per request.', 'endpoint',
+                                     QUERY_COUNT_BUCKETS)
+        self.sql_seconds = Histogram('brs_request_sql_seconds', 'Time spent in SQL statements per request.',
+                                     'endpoint')
+        self.template_seconds = Histogram('brs_request_template_seconds', 'Time spent rendering templates per request.',
+                                          'endpoint')
+        self.section_seconds = Histogram('brs_section_duration_seconds',
+                                         'Time spent in instrumented sections such as sending email or drawing charts.',
+                                         'section')
+
+    def histograms(self):
+        return (self.request_seconds, self.sql_queries, self.sql_seconds, self.template_seconds, self.section_seconds)
+
+    def snapshot(self):
+        return {histogram.name: histogram.snapshot() for histogram in self.histograms()}
+
+    def exposition(self, snapshots=()):
+        return '\n'.join(line for histogram in self.histograms()
+                         for line in histogram.exposition([snapshot.get(histogram.name, {})
+                                                           for snapshot in snapshots])) + '\n'
+
+
+class MetricsDirectory:
+    """Shares Metrics between worker processes through one snapshot file per process in a common directory.
+
+    Each process rewrites its file from a background thread every interval seconds while it has new observations;
+    /metrics, answered by whichever worker the scrape reaches, adds up every file. Files of exited workers are kept,
+    so their counts do not vanish; clear the directory when the server starts.
+    """
+
+    def __init__(self, path, metrics, interval=METRICS_FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.metrics = metrics
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def own_path(self):
+        return os.path.join(self.path, f'{os.getpid()}.json')
+
+    def mark_dirty(self):
+        self._dirty.set()
+        with self._lock:
+            # A worker forked from a process that had already started the thread has to start its own.
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if self._dirty.is_set():
+                self.flush()
+
+    def flush(self):
+        self._dirty.clear()
+        os.makedirs(self.path, exist_ok=True)
+        temporary_path = f'{self.own_path()}.tmp'
+        with open(temporary_path, 'w') as snapshot:
+            json.dump(self.metrics.snapshot(), snapshot)
+        os.replace(temporary_path, self.own_path())
+
+    def exposition(self):
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.path, '*.json')):
+            if path != self.own_path():
+                try:
+                    with open(path) as snapshot:
+                        snapshots.append(json.load(snapshot))
+                except FileNotFoundError:
+                    continue
+        return self.metrics.exposition(snapshots)
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered request threads from one background thread.
+
+    Samples are kept as folded stacks ("outer;inner count"), the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._thread = None
+
+    def register(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def unregister(self, thread_id):
+        with self._lock:
+            return self._threads.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._threads:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, stacks in self._threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[fold_stack(frame)] += 1
+
+
+def fold_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_profile(directory, endpoint, elapsed, stacks):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint}-{elapsed * 1000:.0f}ms.folded")
+    with open(path, 'w') as profile:
+        for stack, count in stacks.most_common():
+            profile.write(f'{stack} {count}\n')
+    return path
+
+
+def current_timings():
+    if has_request_context():
+        return g.get('request_timings')
+    return None
+
+
+@contextmanager
+def timed(section):
+    # Records the time spent in a section of work; a no-op unless instrumentation is enabled for the app.
+    metrics = current_app.extensions.get('metrics') if has_app_context() else None
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.section_seconds.observe(section, elapsed)
+        if 'metrics_directory' in current_app.extensions:
+            current_app.extensions['metrics_directory'].mark_dirty()
+        timings = current_timings()
+        if timings is not None:
+            timings.sections[section] += elapsed
+
+
+def init_instrumentation(app, engine):
+    metrics = app.extensions['metrics'] = Metrics()
+    directory = None
+    if app.config['METRICS_DIRECTORY']:
+        directory = app.extensions['metrics_directory'] = MetricsDirectory(app.config['METRICS_DIRECTORY'], metrics)
+    profiler = SamplingProfiler() if app.config['PROFILE_SLOW_REQUESTS_MS'] else None
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        if current_timings() is not None:
+            conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish_statement(conn, cursor, statement, parameters, context, executemany):
+        timings = current_timings()
+        if timings is not None and conn.info.get('statement_started'):
+            timings.sql_count += 1
+            timings.sql_seconds += time.perf_counter() - conn.info['statement_started'].pop()
+
+    def start_template(sender, template, context, **extra):
+        if current_timings() is not None:
+            g.template_started = time.perf_counter()
+
+    def finish_template(sender, template, context, **extra):
+        timings = current_timings()
+        if timings is not None and g.get('template_started') is not None:
+            timings.template_seconds += time.perf_counter() - g.pop('template_started')
+
+    before_render_template.connect(start_template, app)
+    template_rendered.connect(finish_template, app)
+
+    @app.before_request
+    def start_request_timings():
+        g.request_timings = RequestTimings()
+        if profiler is not None:
+            profiler.register(threading.get_ident())
+
+    @app.teardown_request
+    def record_request_timings(error=None):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return
+        elapsed = time.perf_counter() - timings.started
+        endpoint = request.endpoint or 'unmatched'
+        metrics.request_seconds.observe(endpoint, elapsed)
+        metrics.sql_queries.observe(endpoint, timings.sql_count)
+        metrics.sql_seconds.observe(endpoint, timings.sql_seconds)
+        metrics.template_seconds.observe(endpoint, timings.template_seconds)
+        if directory is not None:
+            directory.mark_dirty()
+        if profiler is not None:
+            stacks = profiler.unregister(threading.get_ident())
+            if stacks and elapsed * 1000 >= app.config['PROFILE_SLOW_REQUESTS_MS']:
+                write_profile(app.config['PROFILE_DIRECTORY'], endpoint, elapsed, stacks)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        exposition = directory.exposition() if directory is not None else metrics.exposition()
+        return Response(exposition, mimetype='text/plain; version=0.0.4')
+
+    return metrics
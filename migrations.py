@@ -0,0 +1,86 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from models import db, seed_data_version, ArchivedBugReport, BugReport
+from search import ensure_search_index
+from sprint_stats import rebuild_sprint_stats
+
+
+def add_missing_columns(connection, table, existing_columns):
+    # New columns need a server_default (or to be nullable) so rows that already exist stay valid.
+    preparer = connection.dialect.identifier_preparer
+    added = []
+    for column in table.columns:
+        if column.name not in existing_columns:
+            column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}'))
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def add_missing_indexes(connection, table, existing_indexes):
+    added = []
+    for index in table.indexes:
+        if index.name not in existing_indexes:
+            index.create(connection)
+            added.append(index.name)
+    return added
+
+
+def enable_sqlite_autoincrement(connection, table, *id_tables):
+    # SQLite cannot change a primary key in place, so the table is rebuilt from the model and its indexes and
+    # triggers recreated; the rows keep their ids. The sequence starts after the highest id in table and id_tables,
+    # so ids already moved out of the table are not reused either.
+    if connection.dialect.name != 'sqlite' or not table.dialect_options['sqlite']['autoincrement']:
+        return False
+    schema = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                {'name': table.name}).scalar()
+    if 'AUTOINCREMENT' in schema.upper():
+        return False
+    dependents = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = :name AND sql IS NOT NULL"
+    ), {'name': table.name}).scalars().all()
+    preparer = connection.dialect.identifier_preparer
+    name, rebuilt = preparer.format_table(table), preparer.quote(f'{table.name}_rebuilt')
+    create = str(CreateTable(table).compile(dialect=connection.dialect))
+    connection.execute(text(create.replace(f'CREATE TABLE {name}', f'CREATE TABLE {rebuilt}', 1)))
+    columns = ', '.join(preparer.quote(column.name) for column in table.columns)
+    connection.execute(text(f'INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}'))
+    connection.execute(text(f'DROP TABLE {name}'))
+    connection.execute(text(f'ALTER TABLE {rebuilt} RENAME TO {name}'))
+    for statement in dependents:
+        connection.execute(text(statement))
+    highest_id = max(connection.execute(text(f'SELECT coalesce(max(id), 0) FROM {preparer.quote(source)}')).scalar()
+                     for source in (table.name, *id_tables))
+    connection.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+    connection.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                       {'name': table.name, 'seq': highest_id})
+    return True
+
+
+def upgrade_database():
+    # Brings an existing database (e.g. an old brs.db) up to the current models without dropping data:
+    # new tables are created, and columns or indexes added to existing tables since are created in place.
+    # The Sprint/BugReport date columns changed from String to Date/DateTime; SQLite already stored them
+    # as ISO-8601 text, which is the representation SQLAlchemy reads back, so no rows need rewriting.
+    had_sprint_stats = inspect(db.engine).has_table('sprint_stats')
+    db.create_all()
+    changes = []
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            changes += add_missing_columns(connection, table, existing_columns)
+            changes += add_missing_indexes(connection, table, existing_indexes)
+        if enable_sqlite_autoincrement(connection, BugReport.__table__, ArchivedBugReport.__tablename__):
+            changes.append('bug_report AUTOINCREMENT')
+        if seed_data_version(connection):
+            changes.append('data_version row')
+        if search_index := ensure_search_index(connection):
+            changes.append(search_index)
+        if not had_sprint_stats:
+            # create_all has just added the table and its triggers; count the reports that were already there.
+            rebuild_sprint_stats(connection)
+            changes.append('sprint_stats')
+    return changes
@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 
 db = SQLAlchemy()
 
@@ -18,6 +20,8 @@ class User(db.Model, UserMixin):
     employee_id: db.Column = db.Column(db.String(), unique=True, nullable=False)
     password: db.Column = db.Column(db.String(), nullable=False)
     email: db.Column = db.Column(db.String(), unique=True, nullable=False)
+    digest_notifications: db.Column = db.Column(db.Boolean(), nullable=False, default=False,
+                                                server_default=db.false())
 
     subscribed_bug_reports = db.relationship('BugReport', secondary=bug_report_subscribers,
                                              back_populates='subscribers')
@@ -33,14 +37,32 @@ class User(db.Model, UserMixin):
 
 
 class Sprint(db.Model):
+    # end_date leads so that looking up the current sprint only scans the few sprints ending after today.
+    __table_args__ = (
+        db.Index('ix_sprint_end_date_start_date', 'end_date', 'start_date'),
+    )
+
     id: db.Column = db.Column(db.Integer, primary_key=True)
-    start_date: db.Column = db.Column(db.String(), nullable=False)
-    end_date: db.Column = db.Column(db.String(), nullable=False)
+    start_date: db.Column = db.Column(db.Date(), nullable=False)
+    end_date: db.Column = db.Column(db.Date(), nullable=False)
     name: db.Column = db.Column(db.String(), nullable=False)
     bugs = db.relationship('BugReport', backref='sprint', lazy=True)
 
+    @validates('start_date', 'end_date')
+    def validate_date(self, key, value):
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+        return value
+
 
 class BugReport(db.Model):
+    # AUTOINCREMENT stops SQLite from handing out the id of a deleted (archived) report again; archived_bug_report
+    # keeps the id, as do the FTS index and the duplicate index log.
+    __table_args__ = (
+        db.Index('ix_bug_report_sprint_id_is_open_is_fixed', 'sprint_id', 'is_open', 'is_fixed'),
+        {'sqlite_autoincrement': True},
+    )
+
     id: db.Column = db.Column(db.Integer, primary_key=True)
     number: db.Column = db.Column(db.Integer(), unique=True, nullable=False)
     bug_type: db.Column = db.Column(db.String(), nullable=False)
@@ -48,13 +70,88 @@ class BugReport(db.Model):
     is_open: db.Column = db.Column(db.Boolean(), default=True)
     is_fixed: db.Column = db.Column(db.Boolean(), default=False)
     reason_for_close: db.Column = db.Column(db.String())
-    created = db.Column(db.String(), default=datetime.utcnow, nullable=False)
-    archived_at = db.Column(db.String(), nullable=True)
+    created = db.Column(db.DateTime(), default=datetime.utcnow, nullable=False, index=True)
+    # Set when the report is closed or fixed; archive.py moves reports resolved long enough ago to archived_bug_report.
+    resolved_at = db.Column(db.DateTime(), nullable=True)
 
+    # Collections stay lazy so listings never pay for them; pages that render them opt into eager loading per query
+    # (see utilities.get_bug_report_detail).
     subscribers = db.relationship('User', secondary=bug_report_subscribers,
-                                  back_populates='subscribed_bug_reports')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+                                  back_populates='subscribed_bug_reports', lazy='select')
+    reporter = db.relationship('User', lazy='select')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     sprint_id = db.Column(db.Integer, db.ForeignKey('sprint.id'), nullable=False)
+    # Incremented by every ORM update (and by hand in bulk UPDATEs); doubles as the API's ETag and an optimistic lock.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<BugReport {self.report_number}>'
+
+
+class ArchivedBugReport(db.Model):
+    # Closed and fixed reports moved out of bug_report, keeping their id and number; subscriptions are not kept.
+    id: db.Column = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    number: db.Column = db.Column(db.Integer(), unique=True, nullable=False)
+    bug_type: db.Column = db.Column(db.String(), nullable=False)
+    description: db.Column = db.Column(db.Text, nullable=False)
+    is_open: db.Column = db.Column(db.Boolean(), nullable=False)
+    is_fixed: db.Column = db.Column(db.Boolean(), nullable=False)
+    reason_for_close: db.Column = db.Column(db.String())
+    created = db.Column(db.DateTime(), nullable=False)
+    resolved_at = db.Column(db.DateTime(), nullable=True)
+    archived_at = db.Column(db.DateTime(), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sprint_id = db.Column(db.Integer, db.ForeignKey('sprint.id'), nullable=False)
+
+    sprint = db.relationship('Sprint', lazy='joined')
+    reporter = db.relationship('User', lazy='joined')
+
+
+class SprintStats(db.Model):
+    # Per-sprint report counts over bug_report and archived_bug_report, kept current by database triggers on both
+    # (see sprint_stats.py), so statistics are read in O(sprints) without scanning reports.
+    __tablename__ = 'sprint_stats'
+
+    sprint_id = db.Column(db.Integer, db.ForeignKey('sprint.id'), primary_key=True, autoincrement=False)
+    total: db.Column = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    open: db.Column = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    fixed: db.Column = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+class DataVersion(db.Model):
+    # Single row bumped whenever bug reports or sprints change, used to key caches derived from that data.
+    id: db.Column = db.Column(db.Integer, primary_key=True)
+    version: db.Column = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+
+
+def seed_data_version(connection):
+    # The row exists before the first bump, so bumps are a plain UPDATE that concurrent writers cannot race to insert.
+    if connection.execute(db.select(DataVersion.id).where(DataVersion.id == 1)).first() is not None:
+        return False
+    connection.execute(db.insert(DataVersion).values(id=1, version=0, updated_at=datetime.utcnow()))
+    return True
+
+
+event.listen(DataVersion.__table__, 'after_create', lambda target, connection, **kw: seed_data_version(connection))
+
+
+class EmailOutbox(db.Model):
+    # Emails are written here in the same transaction as the change they announce and delivered by notifications.py.
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id: db.Column = db.Column(db.Integer, primary_key=True)
+    recipient: db.Column = db.Column(db.String(), nullable=False)
+    subject: db.Column = db.Column(db.String(), nullable=False)
+    body: db.Column = db.Column(db.Text, nullable=False)
+    status: db.Column = db.Column(db.String(), nullable=False, default='pending')
+    attempts: db.Column = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+    claimed_by: db.Column = db.Column(db.String())
+    last_error: db.Column = db.Column(db.String())
+    created = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime())
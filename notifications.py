@@ -0,0 +1,164 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, EmailOutbox, User, bug_report_subscribers
+from utilities import send_emails
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_SECONDS = 5
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+CLAIM_LEASE_SECONDS = 300
+DIGEST_WINDOW_SECONDS = 3600
+
+_worker_lock = threading.Lock()
+
+
+def enqueue_email(recipient, subject, body, digest=False):
+    # Added to the caller's session so the email is only queued if the change it announces is committed.
+    # Digest emails are held back and later coalesced with the recipient's other held emails into one message.
+    db.session.add(EmailOutbox(recipient=recipient, subject=subject, body=body,
+                               status='digest' if digest else 'pending'))
+
+
+def notify_subscribers(report, subject, body):
+    subscribers = db.session.execute(
+        db.select(User.email, User.digest_notifications)
+        .join(bug_report_subscribers, bug_report_subscribers.c.user_id == User.id)
+        .where(bug_report_subscribers.c.bug_report_id == report.id)
+    ).all()
+    for subscriber in subscribers:
+        enqueue_email(subscriber.email, subject, body, digest=subscriber.digest_notifications)
+
+
+def digest_window():
+    return timedelta(seconds=current_app.config.get('NOTIFICATION_DIGEST_WINDOW', DIGEST_WINDOW_SECONDS))
+
+
+def coalesce_digests(now, window):
+    # A recipient's held emails are merged once the oldest has waited a full window, so a triage session produces one
+    # message per subscriber. Rows are claimed with a token first so two drainers cannot both build the same digest.
+    due_recipients = db.session.scalars(
+        db.select(EmailOutbox.recipient).where(EmailOutbox.status == 'digest')
+        .group_by(EmailOutbox.recipient).having(db.func.min(EmailOutbox.created) <= now - window)
+    ).all()
+    for recipient in due_recipients:
+        token = uuid.uuid4().hex
+        db.session.execute(db.update(EmailOutbox).where(
+            EmailOutbox.recipient == recipient, EmailOutbox.status == 'digest'
+        ).values(status='digested', claimed_by=token).execution_options(synchronize_session=False))
+        events = EmailOutbox.query.filter_by(claimed_by=token).order_by(EmailOutbox.created, EmailOutbox.id).all()
+        if events:
+            enqueue_email(recipient, f"{len(events)} bug report updates",
+                          "\n\n----------\n\n".join(f"{event.subject}\n\n{event.body}" for event in events))
+        for event in events:
+            event.claimed_by = None
+        db.session.commit()
+    return len(due_recipients)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def claim_statement(now, token, batch_size):
+    # A claim is a lease: rows left in 'sending' by a drainer that died become claimable again once it expires.
+    # SKIP LOCKED (ignored by SQLite, whose writers are serialised anyway) makes concurrent drainers on PostgreSQL
+    # pick disjoint rows instead of queueing on each other's locks. The materialised CTE runs the locking SELECT
+    # once; as an IN subquery PostgreSQL may rescan it and claim more than batch_size rows. The outer WHERE repeats
+    # the due predicate because PostgreSQL re-checks only the outer conditions on a row changed by another drainer.
+    is_due = (EmailOutbox.status.in_(('pending', 'sending')), EmailOutbox.next_attempt_at <= now)
+    due = db.select(EmailOutbox.id).where(*is_due).order_by(EmailOutbox.next_attempt_at).limit(batch_size) \
+        .with_for_update(skip_locked=True).cte('due').prefix_with('MATERIALIZED', dialect='postgresql')
+    return db.update(EmailOutbox).where(EmailOutbox.id.in_(db.select(due.c.id)), *is_due).values(
+        status='sending', claimed_by=token, next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+    ).execution_options(synchronize_session=False)
+
+
+def claim_outbox_batch(now, batch_size=OUTBOX_BATCH_SIZE):
+    # Claiming is a single UPDATE tagged with a fresh token, so concurrent drainers never pick up the same email.
+    token = uuid.uuid4().hex
+    db.session.execute(claim_statement(now, token, batch_size))
+    db.session.commit()
+    return EmailOutbox.query.filter_by(claimed_by=token, status='sending').order_by(EmailOutbox.id).all()
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, now=None):
+    now = now or datetime.utcnow()
+    coalesce_digests(now, digest_window())
+    messages = claim_outbox_batch(now, batch_size)
+    if not messages:
+        return 0
+    errors = send_emails((message.recipient, message.subject, message.body) for message in messages)
+    for message, error in zip(messages, errors):
+        message.attempts += 1
+        message.claimed_by = None
+        if error is None:
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            continue
+        message.last_error = str(error)[:500]
+        if message.attempts >= MAX_ATTEMPTS:
+            message.status = 'failed'
+        else:
+            message.status = 'pending'
+            message.next_attempt_at = now + retry_delay(message.attempts)
+    db.session.commit()
+    return len(messages)
+
+
+class OutboxWorker(threading.Thread):
+    """Daemon thread that drains the outbox whenever it is woken and otherwise every poll interval."""
+
+    def __init__(self, app, poll_seconds=OUTBOX_POLL_SECONDS):
+        super().__init__(name='outbox-worker', daemon=True)
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while drain_outbox() and not self._stopping.is_set():
+                        pass
+                except Exception as error:
+                    print("Draining the email outbox failed due to:")
+                    print(error)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+def start_outbox_worker(app):
+    worker = app.extensions.get('outbox_worker')
+    if worker is not None and worker.is_alive():
+        return worker
+    with _worker_lock:
+        worker = app.extensions.get('outbox_worker')
+        if worker is None or not worker.is_alive():
+            worker = OutboxWorker(app)
+            app.extensions['outbox_worker'] = worker
+            worker.start()
+    return worker
+
+
+def wake_outbox_worker():
+    worker = current_app.extensions.get('outbox_worker')
+    if worker is not None:
+        worker.wake()
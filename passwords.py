@@ -0,0 +1,85 @@
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from itertools import repeat
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug's scrypt default (N=2**15, r=8, p=1) needs 32 MiB per hash, which makes GPU guessing expensive.
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+def password_hash_method():
+    return os.getenv('password_hash_method', DEFAULT_PASSWORD_HASH_METHOD)
+
+
+@lru_cache(maxsize=None)
+def hash_parameters(method):
+    # The "method:param:param" prefix werkzeug stores in a hash, with defaults filled in, e.g. 'scrypt:32768:8:1'.
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash, method):
+    return password_hash.split('$', 1)[0] != hash_parameters(method)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a small bounded thread pool.
+
+    hashlib's scrypt and pbkdf2 release the GIL, so the pool caps how many cores a login burst can occupy, and at
+    most max_pending hashes are in flight: callers that cannot get a slot within queue_timeout get PasswordHasherBusy
+    instead of piling up behind the pool.
+    """
+
+    def __init__(self, method, workers, max_pending, queue_timeout):
+        self.method = method
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy()
+        try:
+            return self._executor.submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        # For offline batches (provisioning), which may use the whole pool at once.
+        return list(self._executor.map(generate_password_hash, passwords, repeat(self.method)))
+
+    @cached_property
+    def dummy_hash(self):
+        return generate_password_hash(secrets.token_urlsafe(), self.method)
+
+    def verify(self, password_hash, password):
+        # With no stored hash (an unknown username) a dummy hash is checked instead, so the answer takes as long as
+        # for a real account and does not reveal which usernames exist.
+        if password_hash is None:
+            self._run(check_password_hash, self.dummy_hash, password)
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return needs_rehash(password_hash, self.method)
+
+
+def get_password_hasher():
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        config = current_app.config
+        hasher = current_app.extensions.setdefault('password_hasher', PasswordHasher(
+            config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_WORKERS'], config['PASSWORD_HASH_MAX_PENDING'],
+            config['PASSWORD_HASH_QUEUE_TIMEOUT']))
+    return hasher
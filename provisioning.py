@@ -0,0 +1,89 @@
+import secrets
+from collections import Counter
+
+from email_validator import EmailNotValidError, validate_email
+
+from bulk_import import chunked
+from models import db, User
+from utilities import USER_UNIQUE_FIELDS
+
+PROVISION_BATCH_SIZE = 500
+
+
+class UserProvisioner:
+    """Creates user accounts from HR rows with one conflict query, one executemany INSERT and one commit per batch.
+
+    Rows without a password get a generated one; (username, email, password) is passed to on_credentials so it can be
+    handed out.
+    """
+
+    def __init__(self, hasher, batch_size=PROVISION_BATCH_SIZE, on_credentials=None):
+        self.hasher = hasher
+        self.batch_size = batch_size
+        self.on_credentials = on_credentials
+        self.provisioned = 0
+        self.skipped = Counter()
+
+    def convert(self, row):
+        values = {field: (row.get(field) or '').strip() for field in USER_UNIQUE_FIELDS}
+        missing = [field for field, value in values.items() if not value]
+        if missing:
+            return None, f"missing {', '.join(missing)}"
+        try:
+            validate_email(values['email'], check_deliverability=False)
+        except EmailNotValidError:
+            return None, 'invalid email'
+        values['password'] = row.get('password') or None
+        if values['password'] is None and self.on_credentials is None:
+            return None, 'no password and no credentials file'
+        return values, None
+
+    def existing_values(self, rows):
+        existing = {field: set() for field in USER_UNIQUE_FIELDS}
+        found = db.session.execute(db.select(User.username, User.employee_id, User.email).where(db.or_(
+            *(getattr(User, field).in_([row[field] for row in rows]) for field in USER_UNIQUE_FIELDS)))).all()
+        for user in found:
+            for field in USER_UNIQUE_FIELDS:
+                existing[field].add(getattr(user, field))
+        return existing
+
+    def provision_batch(self, rows):
+        converted = []
+        for row in rows:
+            values, error = self.convert(row)
+            if error:
+                self.skipped[error] += 1
+            else:
+                converted.append(values)
+        if not converted:
+            return
+        # Rows colliding with an existing user, or with an earlier row of the batch, are skipped.
+        taken = self.existing_values(converted)
+        accepted = []
+        for values in converted:
+            conflicts = [field for field in USER_UNIQUE_FIELDS if values[field] in taken[field]]
+            if conflicts:
+                self.skipped[f"{', '.join(conflicts)} already exists"] += 1
+                continue
+            for field in USER_UNIQUE_FIELDS:
+                taken[field].add(values[field])
+            accepted.append(values)
+        if not accepted:
+            return
+        generated = []
+        for values in accepted:
+            if values['password'] is None:
+                values['password'] = secrets.token_urlsafe(12)
+                generated.append((values['username'], values['email'], values['password']))
+        for values, password_hash in zip(accepted, self.hasher.hash_many([values['password'] for values in accepted])):
+            values['password'] = password_hash
+        db.session.execute(db.insert(User), accepted)
+        db.session.commit()
+        self.provisioned += len(accepted)
+        for credentials in generated:
+            self.on_credentials(credentials)
+
+    def run(self, rows):
+        for batch in chunked(rows, self.batch_size):
+            self.provision_batch(batch)
+        return self.provisioned
@@ -0,0 +1,108 @@
+import re
+
+from sqlalchemy import DDL, column, event, inspect, table, text
+
+from models import db, BugReport
+from utilities import PAGE_SIZE
+
+# External-content FTS5 index over bug_report, kept in sync by triggers so every write path (ORM, bulk inserts,
+# raw UPDATEs) updates it in the same transaction. PostgreSQL uses a GIN expression index instead, which it maintains
+# itself; other databases fall back to a LIKE scan.
+FTS_COLUMNS = 'description, bug_type, reason_for_close'
+FTS_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS bug_report_fts USING fts5({FTS_COLUMNS}, "
+    f"content='bug_report', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS bug_report_fts_insert AFTER INSERT ON bug_report BEGIN "
+    f"INSERT INTO bug_report_fts(rowid, {FTS_COLUMNS}) "
+    f"VALUES (new.id, new.description, new.bug_type, new.reason_for_close); END",
+    f"CREATE TRIGGER IF NOT EXISTS bug_report_fts_delete AFTER DELETE ON bug_report BEGIN "
+    f"INSERT INTO bug_report_fts(bug_report_fts, rowid, {FTS_COLUMNS}) "
+    f"VALUES ('delete', old.id, old.description, old.bug_type, old.reason_for_close); END",
+    f"CREATE TRIGGER IF NOT EXISTS bug_report_fts_update AFTER UPDATE OF {FTS_COLUMNS} ON bug_report BEGIN "
+    f"INSERT INTO bug_report_fts(bug_report_fts, rowid, {FTS_COLUMNS}) "
+    f"VALUES ('delete', old.id, old.description, old.bug_type, old.reason_for_close); "
+    f"INSERT INTO bug_report_fts(rowid, {FTS_COLUMNS}) "
+    f"VALUES (new.id, new.description, new.bug_type, new.reason_for_close); END",
+]
+# Matches in the bug type weigh more than in the description, and the close reason least.
+BM25_RANK = 'bm25(bug_report_fts, 1.0, 2.0, 0.5)'
+# The same weighting on PostgreSQL; queries must repeat this expression verbatim for the planner to use the index.
+SEARCH_VECTOR = ("(setweight(to_tsvector('english', bug_type), 'A') || "
+                 "setweight(to_tsvector('english', description), 'B') || "
+                 "setweight(to_tsvector('english', coalesce(reason_for_close, '')), 'C'))")
+POSTGRESQL_SEARCH_INDEX = f'CREATE INDEX IF NOT EXISTS ix_bug_report_search ON bug_report USING gin ({SEARCH_VECTOR})'
+# Ranking scores every match (about 1.4 us each for bm25), so a query matching more reports than this ranks only the
+# most recent SEARCH_CANDIDATES of them and says so; queries with fewer matches are ranked exactly.
+SEARCH_CANDIDATES = 1000
+
+bug_report_fts = table('bug_report_fts', column('rowid'))
+
+for statement in FTS_STATEMENTS:
+    event.listen(BugReport.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(BugReport.__table__, 'after_create',
+             DDL(POSTGRESQL_SEARCH_INDEX).execute_if(dialect='postgresql'))
+event.listen(BugReport.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS bug_report_fts').execute_if(dialect='sqlite'))
+
+
+def ensure_search_index(connection):
+    # For databases created before the index existed: create it and index the rows already in bug_report. Returns
+    # the name of the index built, or None.
+    if connection.dialect.name == 'postgresql':
+        if 'ix_bug_report_search' in {index['name'] for index in inspect(connection).get_indexes('bug_report')}:
+            return None
+        connection.execute(text(POSTGRESQL_SEARCH_INDEX))
+        return 'ix_bug_report_search'
+    if connection.dialect.name != 'sqlite' or inspect(connection).has_table('bug_report_fts'):
+        return None
+    for statement in FTS_STATEMENTS:
+        connection.execute(text(statement))
+    connection.execute(text("INSERT INTO bug_report_fts(bug_report_fts) VALUES ('rebuild')"))
+    return 'bug_report_fts'
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+def ranked_page(candidates, offset, limit):
+    # candidates has (id, rank) columns with lower ranks first; returns (reports, has_next_page).
+    ids = db.session.scalars(
+        db.select(candidates.c.id).order_by(candidates.c.rank, candidates.c.id).offset(offset).limit(limit + 1)
+    ).all()
+    reports = {report.id: report for report in BugReport.query.filter(BugReport.id.in_(ids[:limit]))}
+    return [reports[report_id] for report_id in ids[:limit] if report_id in reports], len(ids) > limit
+
+
+def search_bug_reports(query, page=1, limit=PAGE_SIZE):
+    # Results are ranked, so pages are offsets into the ranking. Returns (reports, has_next_page, truncated), where
+    # truncated means more than SEARCH_CANDIDATES reports matched and only the most recent of them were ranked.
+    terms = search_terms(query)
+    if not terms:
+        return [], False, False
+    offset = (page - 1) * limit
+    if db.engine.dialect.name == 'sqlite':
+        # The rowid-ordered LIMIT stops the FTS scan after SEARCH_CANDIDATES matches, so bm25 runs on at most that
+        # many rows, and the join to bug_report is only done for the requested page.
+        matches = db.select(bug_report_fts.c.rowid.label('id')) \
+            .where(text('bug_report_fts MATCH :match').bindparams(match=' '.join(f'"{term}"' for term in terms))) \
+            .order_by(bug_report_fts.c.rowid.desc())
+        rank = db.literal_column(BM25_RANK)
+    elif db.engine.dialect.name == 'postgresql':
+        # plainto_tsquery requires every term; ts_rank is higher for better matches, hence the negation.
+        tsquery = db.func.plainto_tsquery(db.literal_column("'english'"), ' '.join(terms))
+        vector = db.literal_column(SEARCH_VECTOR)
+        matches = db.select(BugReport.id.label('id')).where(vector.op('@@')(tsquery)).order_by(BugReport.id.desc())
+        rank = -db.func.ts_rank(vector, tsquery)
+    else:
+        results = BugReport.query
+        for term in terms:
+            pattern = f'%{term}%'
+            results = results.filter(db.or_(BugReport.description.ilike(pattern), BugReport.bug_type.ilike(pattern),
+                                            BugReport.reason_for_close.ilike(pattern)))
+        rows = results.order_by(BugReport.number).offset(offset).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit, False
+    # Checking for a match beyond the cap walks the index without ranking anything.
+    truncated = db.session.scalar(matches.offset(SEARCH_CANDIDATES).limit(1)) is not None
+    candidates = matches.add_columns(rank.label('rank')).limit(SEARCH_CANDIDATES).subquery()
+    return *ranked_page(candidates, offset, limit), truncated
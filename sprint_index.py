@@ -0,0 +1,47 @@
+import bisect
+import threading
+
+from flask import current_app
+
+from models import db, Sprint
+
+
+class SprintIntervalIndex:
+    """Process-local date -> sprint id lookup over the sprint date ranges, rebuilt lazily after invalidation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def build(self, intervals):
+        # Intervals are (start_date, end_date, sprint_id) sorted by start; max_ends[i] is the latest end date among
+        # intervals[:i + 1], which lets lookup() stop walking left as soon as no earlier sprint can cover the date.
+        intervals = sorted(intervals)
+        starts, max_ends = [], []
+        for start, end, _ in intervals:
+            starts.append(start)
+            max_ends.append(max(end, max_ends[-1]) if max_ends else end)
+        self._snapshot = (starts, intervals, max_ends)
+
+    def load(self):
+        with self._lock:
+            if self._snapshot is None:
+                self.build(db.session.execute(db.select(Sprint.start_date, Sprint.end_date, Sprint.id)).all())
+            return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def lookup(self, day):
+        starts, intervals, max_ends = self._snapshot or self.load()
+        position = bisect.bisect_right(starts, day) - 1
+        while position >= 0 and max_ends[position] >= day:
+            _, end, sprint_id = intervals[position]
+            if end >= day:
+                return sprint_id
+            position -= 1
+        return None
+
+
+def get_sprint_index():
+    return current_app.extensions.setdefault('sprint_index', SprintIntervalIndex())
@@ -0,0 +1,91 @@
+from sqlalchemy import DDL, event, text
+
+from models import db, ArchivedBugReport, BugReport, SprintStats
+
+# sprint_stats is maintained by row triggers on both report tables, so every write path (ORM, bulk INSERTs, batch
+# UPDATEs, imports, archiving, raw SQL) adjusts the counters in its own transaction. Archiving inserts into one
+# table and deletes from the other, which nets out to no change.
+REPORT_TABLES = ('bug_report', 'archived_bug_report')
+OPEN = 'CASE WHEN {row}.is_open THEN 1 ELSE 0 END'
+FIXED = 'CASE WHEN {row}.is_fixed THEN 1 ELSE 0 END'
+SQLITE_ADD = (f"INSERT INTO sprint_stats (sprint_id, total, open, fixed) "
+              f"VALUES (new.sprint_id, 1, {OPEN.format(row='new')}, {FIXED.format(row='new')}) "
+              f"ON CONFLICT (sprint_id) DO UPDATE SET total = total + 1, open = open + excluded.open, "
+              f"fixed = fixed + excluded.fixed;")
+SQLITE_SUBTRACT = (f"UPDATE sprint_stats SET total = total - 1, open = open - {OPEN.format(row='old')}, "
+                   f"fixed = fixed - {FIXED.format(row='old')} WHERE sprint_id = old.sprint_id;")
+SQLITE_STATEMENTS = [
+    statement
+    for table in REPORT_TABLES
+    for statement in (
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sprint_stats_insert AFTER INSERT ON {table} BEGIN {SQLITE_ADD} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sprint_stats_delete AFTER DELETE ON {table} "
+        f"BEGIN {SQLITE_SUBTRACT} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sprint_stats_update AFTER UPDATE OF is_open, is_fixed, sprint_id "
+        f"ON {table} BEGIN {SQLITE_SUBTRACT} {SQLITE_ADD} END",
+    )
+]
+POSTGRESQL_STATEMENTS = [
+    f"""CREATE OR REPLACE FUNCTION sprint_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE sprint_stats SET total = total - 1, open = open - {OPEN.format(row='OLD')},
+            fixed = fixed - {FIXED.format(row='OLD')} WHERE sprint_id = OLD.sprint_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO sprint_stats (sprint_id, total, open, fixed)
+        VALUES (NEW.sprint_id, 1, {OPEN.format(row='NEW')}, {FIXED.format(row='NEW')})
+        ON CONFLICT (sprint_id) DO UPDATE SET total = sprint_stats.total + 1, open = sprint_stats.open + EXCLUDED.open,
+            fixed = sprint_stats.fixed + EXCLUDED.fixed;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+    *(f"CREATE OR REPLACE TRIGGER {table}_sprint_stats AFTER INSERT OR DELETE OR UPDATE OF is_open, is_fixed, "
+      f"sprint_id ON {table} FOR EACH ROW EXECUTE FUNCTION sprint_stats_apply()" for table in REPORT_TABLES),
+]
+TRIGGER_STATEMENTS = {'sqlite': SQLITE_STATEMENTS, 'postgresql': POSTGRESQL_STATEMENTS}
+
+# Created after every table exists; create_all fires this each time it runs, so the statements are idempotent.
+for dialect, statements in TRIGGER_STATEMENTS.items():
+    for statement in statements:
+        event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect=dialect))
+event.listen(db.metadata, 'after_drop',
+             DDL('DROP FUNCTION IF EXISTS sprint_stats_apply()').execute_if(dialect='postgresql'))
+
+
+def counted_reports():
+    # Every report, live or archived, as (sprint_id, is_open, is_fixed) rows.
+    return db.union_all(
+        db.select(BugReport.sprint_id, BugReport.is_open, BugReport.is_fixed),
+        db.select(ArchivedBugReport.sprint_id, ArchivedBugReport.is_open, ArchivedBugReport.is_fixed),
+    ).subquery()
+
+
+def actual_sprint_stats():
+    reports = counted_reports()
+    return db.select(
+        reports.c.sprint_id,
+        db.func.count().label('total'),
+        db.func.sum(db.case((reports.c.is_open, 1), else_=0)).label('open'),
+        db.func.sum(db.case((reports.c.is_fixed, 1), else_=0)).label('fixed'),
+    ).group_by(reports.c.sprint_id)
+
+
+def check_sprint_stats():
+    # Returns {sprint_id: (stored (total, open, fixed), actual (total, open, fixed))} for every sprint that differs.
+    stored = {row.sprint_id: (row.total, row.open, row.fixed) for row in db.session.execute(
+        db.select(SprintStats.sprint_id, SprintStats.total, SprintStats.open, SprintStats.fixed))}
+    actual = {row.sprint_id: (row.total, row.open, row.fixed) for row in db.session.execute(actual_sprint_stats())}
+    return {sprint_id: (stored.get(sprint_id, (0, 0, 0)), actual.get(sprint_id, (0, 0, 0)))
+            for sprint_id in stored.keys() | actual.keys()
+            if stored.get(sprint_id, (0, 0, 0)) != actual.get(sprint_id, (0, 0, 0))}
+
+
+def rebuild_sprint_stats(connection):
+    # Recounts from the report tables; the lock keeps concurrent writers' trigger updates from interleaving with it.
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('LOCK TABLE sprint_stats IN EXCLUSIVE MODE'))
+    connection.execute(db.delete(SprintStats))
+    connection.execute(db.insert(SprintStats).from_select(['sprint_id', 'total', 'open', 'fixed'],
+                                                          actual_sprint_stats()))
@@ -0,0 +1,61 @@
+import os
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'sqlite_only: test relies on SQLite, skipped when test_database_url is set '
+                                       'to another database')
+    config.addinivalue_line('markers', 'postgresql_only: test relies on PostgreSQL, run only when test_database_url '
+                                       'points at one (as in the CI PostgreSQL job)')
+
+
+def pytest_collection_modifyitems(config, items):
+    # The suite runs against SQLite in memory by default, or against e.g. a local PostgreSQL when test_database_url
+    # points at it.
+    url = os.getenv('test_database_url')
+    backend = make_url(url).get_backend_name() if url else 'sqlite'
+    for marker, required in (('sqlite_only', 'sqlite'), ('postgresql_only', 'postgresql')):
+        if backend != required:
+            skip = pytest.mark.skip(reason=f'requires {required}, the test database is {backend}')
+            for item in items:
+                if marker in item.keywords:
+                    item.add_marker(skip)
+
+
+@contextmanager
+def recorded_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager yielding the list of SQL statements executed inside it."""
+    return recorded_queries
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager failing the test when more than `budget` SQL statements run inside it."""
+    @contextmanager
+    def budget_check(budget):
+        with recorded_queries() as statements:
+            yield statements
+        assert len(statements) <= budget, \
+            f'{len(statements)} SQL statements exceeded the budget of {budget}:\n' + '\n'.join(statements)
+
+    return budget_check
@@ -0,0 +1,142 @@
+import pytest
+
+from app import create_app
+from models import db, User, Sprint, BugReport
+from utilities import hash_password
+
+
+@pytest.fixture
+def client():
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def api_client(client):
+    user = User(username="test_user", email="test_email@email.com", password=hash_password("test_password"),
+                employee_id="123456789")
+    db.session.add(user)
+    sprint = Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1', bugs=[])
+    db.session.add(sprint)
+    db.session.commit()
+    db.session.add(BugReport(number=1, bug_type='Type A', description='Bug description', is_open=True,
+                             is_fixed=False, reason_for_close="", user_id=user.id, sprint_id=sprint.id))
+    db.session.commit()
+    client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+    return client
+
+
+def test_api_requires_login(client):
+    response = client.get('/api/v1/bugs')
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'Authentication required'}
+
+
+def test_get_bug_and_conditional_get(api_client):
+    response = api_client.get('/api/v1/bugs/1')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'open'
+    etag = response.headers['ETag']
+
+    response = api_client.get('/api/v1/bugs/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    assert api_client.get('/api/v1/bugs/999').status_code == 404
+
+
+def test_list_bugs_etag_changes_after_transition(api_client):
+    response = api_client.get('/api/v1/bugs')
+    assert [bug['number'] for bug in response.get_json()['bugs']] == [1]
+    etag = response.headers['ETag']
+    assert api_client.get('/api/v1/bugs', headers={'If-None-Match': etag}).status_code == 304
+
+    assert api_client.post('/api/v1/bugs/1/fix').status_code == 200
+    response = api_client.get('/api/v1/bugs', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['bugs'][0]['status'] == 'fixed'
+
+
+def test_create_bug(api_client):
+    response = api_client.post('/api/v1/bugs', json={'number': 2, 'bug_type': 'Type B',
+                                                     'description': 'Another bug', 'date': '2024-01-05'})
+    assert response.status_code == 201
+    assert response.headers['Location'].endswith('/api/v1/bugs/2')
+    assert response.get_json()['bug']['sprint_id'] is not None
+
+    assert api_client.post('/api/v1/bugs', json={'number': 2, 'bug_type': 'Type B',
+                                                 'description': 'Again', 'date': '2024-01-05'}).status_code == 409
+    assert api_client.post('/api/v1/bugs', json={'number': 3, 'bug_type': 'Type B',
+                                                 'description': 'Later', 'date': '2025-01-05'}).status_code == 422
+    assert api_client.post('/api/v1/bugs', data='not json').status_code == 400
+
+
+def test_create_bug_rejects_bad_types(api_client):
+    fields = {'bug_type': 'Type B', 'description': 'Another bug'}
+    assert api_client.post('/api/v1/bugs', json={**fields, 'number': True}).status_code == 400
+    assert api_client.post('/api/v1/bugs', json={**fields, 'number': 2, 'date': 20240105}).status_code == 400
+    assert api_client.post('/api/v1/bugs', json={**fields, 'number': 2, 'date': 'not-a-date'}).status_code == 400
+    assert api_client.get('/api/v1/bugs/2').status_code == 404
+
+
+def test_close_with_if_match(api_client):
+    etag = api_client.get('/api/v1/bugs/1').headers['ETag']
+    response = api_client.post('/api/v1/bugs/1/close', json={'reason': 'Duplicate'},
+                               headers={'If-Match': '"bug-1-99"'})
+    assert response.status_code == 412
+
+    response = api_client.post('/api/v1/bugs/1/close', json={'reason': 'Duplicate'}, headers={'If-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'closed'
+    assert response.headers['ETag'] != etag
+
+    assert api_client.post('/api/v1/bugs/1/fix').status_code == 409
+
+
+def test_sprints(api_client):
+    response = api_client.post('/api/v1/sprints', json={'name': 'Sprint 2', 'start_date': '2024-01-15',
+                                                        'end_date': '2024-01-28'})
+    assert response.status_code == 201
+    sprint_id = response.get_json()['id']
+    assert api_client.get(f'/api/v1/sprints/{sprint_id}').get_json()['name'] == 'Sprint 2'
+    assert [sprint['name'] for sprint in api_client.get('/api/v1/sprints').get_json()['sprints']] == \
+        ['Sprint 1', 'Sprint 2']
+
+    assert api_client.post('/api/v1/sprints', json={'name': 'Sprint 2', 'start_date': '2024-01-15',
+                                                    'end_date': '2024-01-28'}).status_code == 409
+    assert api_client.post('/api/v1/sprints', json={'name': 'Sprint 3', 'start_date': '2024-02-15',
+                                                    'end_date': '2024-02-01'}).status_code == 400
+
+
+def test_batch_transition(api_client):
+    sprint = db.session.scalars(db.select(Sprint)).one()
+    user = db.session.scalars(db.select(User)).one()
+    for number in (2, 3):
+        report = BugReport(number=number, bug_type='Type A', description=f'Bug {number}', is_open=True,
+                           is_fixed=False, reason_for_close="", user_id=user.id, sprint_id=sprint.id)
+        report.subscribers.append(user)
+        db.session.add(report)
+    db.session.commit()
+    etag = api_client.get('/api/v1/bugs/2').headers['ETag']
+    assert api_client.post('/api/v1/bugs/3/fix').status_code == 200
+
+    response = api_client.post('/api/v1/bugs/batch', json={'numbers': [1, 2, 3, 99, 2], 'state': 'closed',
+                                                           'reason': 'Released'})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [
+        {'number': 1, 'outcome': 'closed'}, {'number': 2, 'outcome': 'closed'},
+        {'number': 3, 'outcome': 'unchanged'}, {'number': 99, 'outcome': 'not_found'},
+    ]
+    response = api_client.get('/api/v1/bugs/2')
+    assert response.get_json()['status'] == 'closed'
+    assert response.get_json()['reason_for_close'] == 'Released'
+    assert response.headers['ETag'] != etag
+
+    assert api_client.post('/api/v1/bugs/batch', json={'numbers': [1], 'state': 'open'}).status_code == 400
+    assert api_client.post('/api/v1/bugs/batch', json={'numbers': ['1'], 'state': 'fixed'}).status_code == 400
+    assert api_client.post('/api/v1/bugs/batch', json={'numbers': [True], 'state': 'fixed'}).status_code == 400
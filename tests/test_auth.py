@@ -1,4 +1,5 @@
 import pytest
+from werkzeug.security import generate_password_hash
 
 from app import create_app
 from models import db, User
@@ -137,3 +138,75 @@ def test_logout_route_incorrect(client):
     response = client.get('/logout', follow_redirects=True)
     assert response.status_code == 200
 
+
+@pytest.fixture
+def session_client():
+    """Logged-in client whose requests each run in their own app context, as in production, so that Flask-Login
+    loads the user from the session instead of reusing the one cached on `g` by the login request."""
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="test_user", email="test_email@email.com",
+                            password=hash_password("test_password"), employee_id="123456789"))
+        db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+    yield client
+    with app.app_context():
+        db.drop_all()
+
+
+def test_authenticated_requests_reuse_cached_identity(session_client, count_queries):
+    session_client.get('/')
+    with session_client.application.app_context(), count_queries() as statements:
+        response = session_client.get('/')
+    assert response.status_code == 200
+    assert b'Logout' in response.data
+    assert statements == []
+
+
+def test_change_password_updates_stored_hash(session_client):
+    session_client.get('/')
+    response = session_client.post('/change_password', data={
+        'current_password': 'test_password', 'new_password': 'new_password', 'confirm_password': 'new_password'
+    }, follow_redirects=True)
+    assert b'Password changed successfully' in response.data
+    session_client.get('/logout')
+    response = session_client.post('/login', data={'username': 'test_user', 'password': 'new_password'},
+                                   follow_redirects=True)
+    assert response.request.path == "/"
+
+
+def test_logout_evicts_cached_identity(session_client):
+    session_client.get('/')
+    cache = session_client.application.extensions['identity_cache']
+    assert len(cache) == 1
+    session_client.get('/logout')
+    assert len(cache) == 0
+
+
+def test_login_upgrades_outdated_password_hash(client):
+    db.session.add(User(username="test_user", email="test_email@email.com", employee_id="123456789",
+                        password=generate_password_hash("test_password", method='pbkdf2:sha256:1000')))
+    db.session.commit()
+    response = client.post('/login', data={'username': 'test_user', 'password': 'test_password'},
+                           follow_redirects=True)
+    assert response.request.path == "/"
+    assert User.query.one().password.startswith('scrypt:32768:8:1$')
+
+
+def test_register_reports_every_conflicting_field(logged_in_client, count_queries):
+    with count_queries() as statements:
+        response = logged_in_client.post('/register', data={
+            "username": "test_user",
+            "email": "test_email@email.com",
+            "password": "test_password",
+            "confirm_password": "test_password",
+            "employee_id": "987654321"
+        }, follow_redirects=True)
+    assert b'Username already exists!' in response.data
+    assert b'Email already exists!' in response.data
+    assert b'Employee ID already exists!' not in response.data
+    assert len([statement for statement in statements if statement.startswith('SELECT')]) == 1
+    assert User.query.count() == 1
@@ -1,8 +1,12 @@
+import json
+from datetime import datetime
+
 import pytest
 
 from app import create_app
-from models import db, User, Sprint, BugReport
-from utilities import hash_password
+from archive import archive_bug_reports
+from models import db, User, Sprint, BugReport, EmailOutbox
+from utilities import hash_password, bump_data_version
 
 
 @pytest.fixture
@@ -108,6 +112,22 @@ def test_fix_bug_report_route(logged_in_client):
     assert response.status_code == 302  # Redirects to /bugs/1
 
 
+@pytest.mark.parametrize('path, data', [
+    ('/edit_bug_report/1', {'bug_type': 'Updated Type'}),
+    ('/bug_report/close/1', {'close_reason': 'Reason'}),
+    ('/bug_report/fix/1', {}),
+])
+def test_bug_report_changed_concurrently(logged_in_client, path, data):
+    report = BugReport.query.filter_by(number=1).one()
+    # Another worker saves the report after this request has loaded it.
+    db.session.execute(db.text('UPDATE bug_report SET version = version + 1 WHERE number = 1'))
+    response = logged_in_client.post(path, data=data, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'changed by someone else' in response.data
+    db.session.refresh(report)
+    assert report.is_open and report.bug_type == 'Type A'
+
+
 def test_sprint_route_get(logged_in_client):
     response = logged_in_client.get('/sprint')
     assert response.status_code == 200
@@ -134,3 +154,234 @@ def test_sprint_route_post_new_sprint(logged_in_client):
 def test_sprint_statistics_route(logged_in_client):
     response = logged_in_client.get('/sprint_statistics', follow_redirects=True)
     assert response.status_code == 200
+
+
+def add_bug_reports(count, start=2, **fields):
+    user = User.query.first()
+    sprint = Sprint.query.first()
+    for number in range(start, start + count):
+        db.session.add(BugReport(number=number, bug_type=fields.get('bug_type', 'Type A'),
+                                 description='Bug description', is_open=fields.get('is_open', True),
+                                 is_fixed=fields.get('is_fixed', False), reason_for_close="",
+                                 user_id=user.id, sprint_id=sprint.id))
+    db.session.commit()
+
+
+def test_bugs_route_paginates(logged_in_client):
+    add_bug_reports(4)
+    response = logged_in_client.get('/bugs?limit=2')
+    assert b'/bugs/1"' in response.data
+    assert b'/bugs/2"' in response.data
+    assert b'/bugs/3"' not in response.data
+    assert b'after=2' in response.data
+
+    response = logged_in_client.get('/bugs?limit=2&after=4')
+    assert b'/bugs/5"' in response.data
+    assert b'Next page' not in response.data
+
+
+def test_bugs_route_filters(logged_in_client):
+    add_bug_reports(2, bug_type='Type B', is_open=False, is_fixed=True)
+    response = logged_in_client.get('/bugs?status=fixed&bug_type=Type+B&reporter=test_user')
+    assert b'/bugs/1"' not in response.data
+    assert b'/bugs/2"' in response.data
+    assert b'/bugs/3"' in response.data
+
+    response = logged_in_client.get('/bugs?reporter=nobody')
+    assert b'/bugs/1"' not in response.data
+
+
+def test_sprints_route(logged_in_client):
+    response = logged_in_client.get('/sprints')
+    assert response.status_code == 200
+    assert b'Sprint 1' in response.data
+
+
+def test_bug_report_route_post_in_new_sprint(logged_in_client):
+    logged_in_client.post('/bug_report', data={
+        'report_number': '2',
+        'bug_type': 'Type',
+        'bug_summary': 'Summary',
+        'current_date': '2024-01-02',
+    })
+    logged_in_client.post('/sprint', data={
+        'sprint_name': 'Sprint 2',
+        'start_date': '2024-02-01',
+        'end_date': '2024-02-14',
+        'description': 'Second sprint'
+    })
+    response = logged_in_client.post('/bug_report', data={
+        'report_number': '3',
+        'bug_type': 'Type',
+        'bug_summary': 'Summary',
+        'current_date': '2024-02-03',
+    }, follow_redirects=True)
+    assert b'Bug Report Created' in response.data
+    assert BugReport.query.filter_by(number=3).one().sprint.name == 'Sprint 2'
+
+
+def count_statements(client, path, count_queries):
+    with count_queries() as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_sprint_statistics_query_count_is_constant(logged_in_client, count_queries):
+    baseline = count_statements(logged_in_client, '/sprint_statistics/chart.svg', count_queries)
+    user = User.query.first()
+    for i in range(2, 12):
+        sprint = Sprint(start_date=f'2023-{i:02d}-01', end_date=f'2023-{i:02d}-14', name=f'Sprint {i}')
+        db.session.add(sprint)
+        db.session.flush()
+        db.session.add(BugReport(number=i, bug_type='Type A', description='Bug description', is_open=True,
+                                 is_fixed=False, reason_for_close="", user_id=user.id, sprint_id=sprint.id))
+    bump_data_version()
+    db.session.commit()
+    assert count_statements(logged_in_client, '/sprint_statistics/chart.svg', count_queries) == baseline
+
+
+def test_sprint_statistics_chart_conditional_get(logged_in_client):
+    response = logged_in_client.get('/sprint_statistics/chart.svg')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+    assert b'Sprint 1 (2024-01-01 - 2024-01-14)' in response.data
+    etag = response.headers['ETag']
+
+    response = logged_in_client.get('/sprint_statistics/chart.svg', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_sprint_statistics_png_chart(logged_in_client):
+    pytest.importorskip('matplotlib')
+    response = logged_in_client.get('/sprint_statistics/chart.png')
+    assert response.status_code == 200
+    assert response.data.startswith(b'\x89PNG')
+
+
+def test_sprint_statistics_chart_unknown_format(logged_in_client):
+    assert logged_in_client.get('/sprint_statistics/chart.gif').status_code == 404
+
+
+def test_sprint_statistics_api(logged_in_client):
+    response = logged_in_client.get('/api/sprint_statistics')
+    assert response.status_code == 200
+    assert response.get_json() == [{'id': 1, 'name': 'Sprint 1', 'start_date': '2024-01-01',
+                                    'end_date': '2024-01-14', 'total': 1, 'open': 1, 'fixed': 0}]
+    response = logged_in_client.get('/api/sprint_statistics', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_sprint_statistics_revalidation_skips_aggregate(logged_in_client, count_queries):
+    for path in ('/api/sprint_statistics', '/sprint_statistics/chart.svg'):
+        etag = logged_in_client.get(path).headers['ETag']
+        with count_queries() as statements:
+            assert logged_in_client.get(path, headers={'If-None-Match': etag}).status_code == 304
+        assert not [statement for statement in statements if 'sprint_stats' in statement]
+
+
+def test_sprint_statistics_chart_invalidated_by_mutation(logged_in_client):
+    etag = logged_in_client.get('/sprint_statistics/chart.svg').headers['ETag']
+    logged_in_client.post('/bug_report/fix/1', data={})
+    response = logged_in_client.get('/sprint_statistics/chart.svg', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Last-Modified' in response.headers
+
+
+@pytest.mark.parametrize("method, path, budget", [
+    ('get', '/bugs', 2),
+    ('get', '/bugs/1', 3),
+    ('post', '/subscribe_bug_report/1', 5),
+    ('get', '/sprint_statistics', 1),
+    ('get', '/sprint_statistics/chart.svg', 3),
+])
+def test_route_sql_budget(logged_in_client, query_budget, method, path, budget):
+    with query_budget(budget):
+        response = getattr(logged_in_client, method)(path)
+    assert response.status_code in (200, 302)
+
+
+def test_bug_route_sql_is_independent_of_subscribers(logged_in_client, count_queries):
+    baseline = count_statements(logged_in_client, '/bugs/1', count_queries)
+    bug_report = BugReport.query.filter_by(number=1).one()
+    for i in range(5):
+        user = User(username=f"user_{i}", email=f"user_{i}@email.com", password="hash", employee_id=str(i))
+        bug_report.subscribers.append(user)
+    db.session.commit()
+    with count_queries() as statements:
+        response = logged_in_client.get('/bugs/1')
+    assert len(statements) == baseline
+    assert b'user_4' in response.data
+    assert b'Reported by: test_user' in response.data
+
+
+def test_subscribe_toggle(logged_in_client):
+    response = logged_in_client.post('/subscribe_bug_report/1', follow_redirects=True)
+    assert b'User subscribed successfully' in response.data
+    assert [user.username for user in BugReport.query.filter_by(number=1).one().subscribers] == ['test_user']
+    response = logged_in_client.post('/subscribe_bug_report/1', follow_redirects=True)
+    assert b'User unsubscribed successfully' in response.data
+
+
+def test_export_bugs_csv(logged_in_client):
+    add_bug_reports(2, start=2, bug_type='Type B', is_open=False, is_fixed=True)
+    response = logged_in_client.get('/bugs/export.csv?status=fixed')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'number,bug_type,description,is_open,is_fixed,reason_for_close,created,user_id,sprint_id'
+    assert [line.split(',')[0] for line in lines[1:]] == ['2', '3']
+
+
+def test_export_bugs_ndjson(logged_in_client):
+    add_bug_reports(1, start=2)
+    response = logged_in_client.get('/bugs/export.ndjson?sprint_id=1&bug_type=Type+A')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['number'] for row in rows] == [1, 2]
+    assert rows[0]['is_open'] is True
+
+
+def test_export_bugs_include_archived(logged_in_client):
+    add_bug_reports(2, start=2, is_open=False, is_fixed=True)
+    add_bug_reports(1, start=4, bug_type='Type B', is_open=False, is_fixed=True)
+    BugReport.query.filter_by(number=2).one().resolved_at = datetime(2024, 1, 1)
+    BugReport.query.filter_by(number=4).one().resolved_at = datetime(2024, 1, 1)
+    db.session.commit()
+    assert archive_bug_reports(older_than_days=180, now=datetime(2025, 1, 1)) == 2
+
+    rows = logged_in_client.get('/bugs/export.csv').get_data(as_text=True).splitlines()
+    assert [line.split(',')[0] for line in rows[1:]] == ['1', '3']
+    rows = logged_in_client.get('/bugs/export.csv?include_archived=true').get_data(as_text=True).splitlines()
+    assert [line.split(',')[0] for line in rows[1:]] == ['1', '2', '3', '4']
+    response = logged_in_client.get('/bugs/export.ndjson?include_archived=true&status=fixed&bug_type=Type+A')
+    assert [json.loads(line)['number'] for line in response.get_data(as_text=True).splitlines()] == [2, 3]
+    response = logged_in_client.get('/bugs/export.ndjson?include_archived=true&reporter=test_user&sprint_id=1')
+    assert len(response.get_data(as_text=True).splitlines()) == 4
+    assert b'include_archived=true' in logged_in_client.get('/bugs').data
+
+
+def test_export_bugs_unknown_format(logged_in_client):
+    assert logged_in_client.get('/bugs/export.xml').status_code == 404
+
+
+def test_batch_fix_sends_one_email_per_subscriber(logged_in_client):
+    add_bug_reports(3)
+    user = User.query.first()
+    for report in BugReport.query.all():
+        report.subscribers.append(user)
+    db.session.commit()
+    response = logged_in_client.post('/bugs/batch', data={'bug_numbers': '1, 2 3\n4, 7', 'state': 'fixed'},
+                                     follow_redirects=True)
+    assert b'4 of 5 bug reports marked as fixed' in response.data
+    assert b'Not found' in response.data
+    assert BugReport.query.filter_by(is_fixed=True).count() == 4
+    assert [email.subject for email in EmailOutbox.query.all()] == ['4 bug reports are fixed']
+
+
+def test_batch_transition_rejects_bad_numbers(logged_in_client):
+    response = logged_in_client.post('/bugs/batch', data={'bug_numbers': '1, two', 'state': 'closed'})
+    assert b'must be whole numbers' in response.data
+    assert BugReport.query.filter_by(number=1).one().is_open
@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+import pytest
+
+from app import create_app
+from instrumentation import Metrics
+from models import db, User
+from utilities import hash_password
+
+
+@pytest.fixture
+def instrumented_app(monkeypatch, tmp_path):
+    monkeypatch.setenv('instrumentation', 'true')
+    monkeypatch.setenv('profile_slow_requests_ms', '50')
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['PROFILE_DIRECTORY'] = str(tmp_path)
+    app.add_url_rule('/slow', 'slow', lambda: time.sleep(0.1) or 'done')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="test_user", email="test_email@email.com",
+                            password=hash_password("test_password"), employee_id="123456789"))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_metrics_disabled_by_default():
+    app = create_app(testing=True)
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_record_requests(instrumented_app):
+    client = instrumented_app.test_client()
+    client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+    client.get('/bugs')
+
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE brs_request_duration_seconds histogram' in text
+    assert 'brs_request_duration_seconds_count{endpoint="bugs"} 1' in text
+    assert 'brs_request_sql_queries_bucket{endpoint="bugs",le="+Inf"} 1' in text
+    assert 'brs_request_template_seconds_count{endpoint="bugs"} 1' in text
+
+    metrics = instrumented_app.extensions['metrics']
+    assert metrics.sql_queries.count('login') == 1
+
+
+def test_slow_requests_are_profiled(instrumented_app, tmp_path):
+    client = instrumented_app.test_client()
+    client.get('/bugs')
+    assert list(tmp_path.iterdir()) == []
+
+    client.get('/slow')
+    [profile] = tmp_path.iterdir()
+    assert profile.name.endswith('.folded') and '-slow-' in profile.name
+    stack, count = profile.read_text().splitlines()[0].rsplit(' ', 1)
+    assert '<lambda> (test_metrics.py' in stack.split(';')[-1]
+    assert int(count) > 0
+
+
+def test_metrics_are_shared_between_workers(monkeypatch, tmp_path):
+    monkeypatch.setenv('instrumentation', 'true')
+    monkeypatch.setenv('metrics_directory', str(tmp_path))
+    app = create_app(testing=True)
+    # Another worker process left its snapshot in the shared directory.
+    other_worker = Metrics()
+    other_worker.request_seconds.observe('home', 0.02)
+    (tmp_path / '1.json').write_text(json.dumps(other_worker.snapshot()))
+
+    client = app.test_client()
+    client.get('/')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'brs_request_duration_seconds_count{endpoint="home"} 2' in text
+    assert 'brs_request_duration_seconds_bucket{endpoint="home",le="+Inf"} 2' in text
+    assert (tmp_path / f'{os.getpid()}.json').exists()
@@ -0,0 +1,104 @@
+import pytest
+
+from app import create_app
+from migrations import upgrade_database
+from models import db, User, Sprint, BugReport
+import search
+from search import search_bug_reports
+from utilities import hash_password
+
+
+@pytest.fixture
+def client():
+    """Create and configure a new app instance for each test."""
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def logged_in_client(client):
+    user = User(username="test_user", email="test_email@email.com", password=hash_password("test_password"),
+                employee_id="123456789")
+    sprint = Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1')
+    db.session.add_all([user, sprint])
+    db.session.commit()
+    for number, bug_type, description in [
+        (1, 'Crash', 'The login page crashes when the password is empty'),
+        (2, 'UI', 'Sprint statistics chart labels overlap'),
+        (3, 'Login', 'Password reset email never arrives'),
+    ]:
+        db.session.add(BugReport(number=number, bug_type=bug_type, description=description, is_open=True,
+                                 is_fixed=False, reason_for_close="", user_id=user.id, sprint_id=sprint.id))
+    db.session.commit()
+    client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+    return client
+
+
+def numbers(reports):
+    return [report.number for report in reports]
+
+
+def test_search_ranks_bug_type_matches_first(logged_in_client):
+    results, has_next, _ = search_bug_reports('login')
+    assert numbers(results) == [3, 1]
+    assert not has_next
+
+
+def test_search_requires_every_term(logged_in_client):
+    assert numbers(search_bug_reports('password empty')[0]) == [1]
+    assert search_bug_reports('"unbalanced AND (')[0] == []
+    assert search_bug_reports('')[0] == []
+
+
+def test_search_index_follows_updates(logged_in_client):
+    logged_in_client.post('/edit_bug_report/2', data={'description': 'Statistics legend is unreadable'})
+    assert search_bug_reports('overlap')[0] == []
+    assert numbers(search_bug_reports('legend')[0]) == [2]
+    logged_in_client.post('/bug_report/close/2', data={'close_reason': 'Duplicate of another report'})
+    assert numbers(search_bug_reports('duplicate')[0]) == [2]
+
+
+def test_search_paginates(logged_in_client):
+    results, has_next, _ = search_bug_reports('password', limit=1)
+    assert len(results) == 1 and has_next
+    results, has_next, _ = search_bug_reports('password', page=2, limit=1)
+    assert len(results) == 1 and not has_next
+
+
+def test_search_ranks_only_the_most_recent_matches_beyond_the_cap(logged_in_client, monkeypatch):
+    assert search_bug_reports('login')[2] is False
+    monkeypatch.setattr(search, 'SEARCH_CANDIDATES', 1)
+    results, has_next, truncated = search_bug_reports('login')
+    assert numbers(results) == [3] and not has_next and truncated
+    assert b'most recent of them are ranked' in logged_in_client.get('/bugs/search?q=login').data
+
+
+def test_search_route(logged_in_client):
+    response = logged_in_client.get('/bugs/search?q=chart')
+    assert response.status_code == 200
+    assert b'/bugs/2"' in response.data
+    assert b'/bugs/1"' not in response.data
+
+
+@pytest.mark.sqlite_only
+def test_upgrade_database_builds_search_index_for_existing_rows(logged_in_client):
+    db.session.execute(db.text('DROP TABLE bug_report_fts'))
+    for trigger in ('insert', 'update', 'delete'):
+        db.session.execute(db.text(f'DROP TRIGGER bug_report_fts_{trigger}'))
+    db.session.commit()
+    assert 'bug_report_fts' in upgrade_database()
+    assert numbers(search_bug_reports('chart')[0]) == [2]
+
+
+@pytest.mark.postgresql_only
+def test_upgrade_database_builds_postgresql_search_index(logged_in_client):
+    db.session.execute(db.text('DROP INDEX ix_bug_report_search'))
+    db.session.commit()
+    assert 'ix_bug_report_search' in upgrade_database()
+    assert numbers(search_bug_reports('chart')[0]) == [2]
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from archive import archive_bug_reports
+from models import db, User, Sprint, BugReport, ArchivedBugReport, SprintStats, bug_report_subscribers
+from utilities import bug_number_exists, get_sprint_bug_counts, hash_password
+
+NOW = datetime(2024, 12, 1)
+
+
+@pytest.fixture
+def client():
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            user = User(username="test_user", email="test_email@email.com", password=hash_password("test_password"),
+                        employee_id="123456789")
+            sprint = Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1')
+            db.session.add_all([user, sprint])
+            db.session.commit()
+            old = NOW - timedelta(days=200)
+            for number, is_open, is_fixed, resolved_at in ((1, False, True, old), (2, False, False, old),
+                                                           (3, False, True, NOW - timedelta(days=10)),
+                                                           (4, True, False, None)):
+                report = BugReport(number=number, bug_type='Type A', description=f'Bug {number}', is_open=is_open,
+                                   is_fixed=is_fixed, reason_for_close='', user_id=user.id, sprint_id=sprint.id,
+                                   created=old, resolved_at=resolved_at)
+                report.subscribers.append(user)
+                db.session.add(report)
+            db.session.commit()
+            client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+def test_archive_moves_old_resolved_reports(client):
+    before = [tuple(row) for row in get_sprint_bug_counts()]
+    assert archive_bug_reports(older_than_days=180, batch_size=1, now=NOW) == 2
+    assert sorted(report.number for report in BugReport.query) == [3, 4]
+    assert sorted(report.number for report in ArchivedBugReport.query) == [1, 2]
+    assert db.session.execute(db.select(db.func.count()).select_from(bug_report_subscribers)).scalar() == 2
+    stats = db.session.get(SprintStats, 1)
+    assert (stats.total, stats.open, stats.fixed) == (4, 1, 2)
+    assert [tuple(row) for row in get_sprint_bug_counts()] == before
+    assert bug_number_exists(1) and bug_number_exists(3) and not bug_number_exists(5)
+
+    assert archive_bug_reports(older_than_days=180, now=NOW) == 0
+
+
+def test_archive_after_highest_id_was_archived(client):
+    db.session.execute(db.update(BugReport).where(BugReport.number == 4).values(
+        is_open=False, resolved_at=NOW - timedelta(days=200)))
+    db.session.commit()
+    assert archive_bug_reports(older_than_days=180, now=NOW) == 3
+    report = BugReport(number=5, bug_type='Type A', description='Bug 5', is_open=False, is_fixed=True,
+                       reason_for_close='', user_id=1, sprint_id=1, created=NOW, resolved_at=NOW - timedelta(days=200))
+    db.session.add(report)
+    db.session.commit()
+    # The new report must not reuse the id of report 4, which is already in archived_bug_report.
+    assert report.id == 5
+    assert archive_bug_reports(older_than_days=180, now=NOW) == 1
+    assert sorted(report.number for report in ArchivedBugReport.query) == [1, 2, 4, 5]
+
+
+def test_archived_report_stays_reachable(client):
+    archive_bug_reports(older_than_days=180, now=NOW)
+    response = client.get('/bugs/1')
+    assert response.status_code == 200
+    assert b'Archived on 2024-12-01' in response.data
+    assert b'Mark as Fixed' not in response.data
+    assert b'/bugs/1"' not in client.get('/bugs').data
+
+    response = client.post('/bug_report', data={'report_number': 1, 'bug_type': 'Type A', 'bug_summary': 'Again',
+                                                'current_date': '2024-01-05'}, follow_redirects=True)
+    assert b'Bug report already exists!' in response.data
+
+
+def test_edit_cannot_take_an_archived_number(client):
+    archive_bug_reports(older_than_days=180, now=NOW)
+    response = client.post('/edit_bug_report/4', data={'report_number': '1'}, follow_redirects=True)
+    assert b'Bug report #1 already exists!' in response.data
+    assert BugReport.query.filter_by(number=4).one()
+    assert b'Archived on 2024-12-01' in client.get('/bugs/1').data
+
+    client.post('/edit_bug_report/4', data={'report_number': '6'})
+    assert BugReport.query.filter_by(number=6).one().id == 4
+
+
+def test_closing_sets_resolved_at(client):
+    client.post('/bug_report/fix/4')
+    assert BugReport.query.filter_by(number=4).one().resolved_at is not None
+
+
+def test_archive_bugs_command(client):
+    result = client.application.test_cli_runner().invoke(args=['archive-bugs', '--older-than-days', '0'])
+    assert 'Archived 3 bug reports' in result.output
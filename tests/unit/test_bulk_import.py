@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+from app import create_app
+from bulk_import import BugReportImporter, read_rows
+from models import db, User, Sprint, BugReport
+
+CSV_ROWS = '''number,bug_type,description,reporter,created,is_open,is_fixed,reason_for_close
+10,Crash,Crashes on start,test_user,2024-01-03,true,false,
+11,UI,Button misaligned,test_user,2024-01-20T09:30:00,false,true,
+12,UI,Unknown reporter,nobody,2024-01-03,true,false,
+13,UI,Outside every sprint,test_user,2023-06-01,true,false,
+1,UI,Number already taken,test_user,2024-01-03,true,false,
+'''
+
+
+@pytest.fixture
+def app():
+    app = create_app(testing=True)
+    with app.app_context():
+        db.create_all()
+        user = User(username="test_user", email="test_email@email.com", password="hash", employee_id="123456789")
+        db.session.add_all([user, Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1'),
+                            Sprint(start_date='2024-01-15', end_date='2024-01-28', name='Sprint 2')])
+        db.session.commit()
+        db.session.add(BugReport(number=1, bug_type='Type A', description='Existing', is_open=True, is_fixed=False,
+                                 user_id=user.id, sprint_id=1))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_import_csv(app):
+    importer = BugReportImporter(batch_size=2)
+    assert importer.run(read_rows(io.StringIO(CSV_ROWS), 'csv')) == 2
+    assert importer.skipped == {'unknown reporter': 1, 'no sprint for created date': 1, 'duplicate number': 1}
+    crash = BugReport.query.filter_by(number=10).one()
+    assert crash.sprint_id == 1 and crash.is_open and not crash.is_fixed
+    fixed = BugReport.query.filter_by(number=11).one()
+    assert fixed.sprint_id == 2 and fixed.is_fixed and not fixed.is_open
+    assert fixed.created.hour == 9
+
+
+def test_import_jsonl_skips_duplicates_within_file(app):
+    lines = [json.dumps({'number': 20, 'bug_type': 'Crash', 'description': 'First', 'user_id': 1, 'sprint_id': 2}),
+             json.dumps({'number': 20, 'bug_type': 'Crash', 'description': 'Again', 'user_id': 1, 'sprint_id': 2}),
+             '']
+    importer = BugReportImporter()
+    assert importer.run(read_rows(io.StringIO('\n'.join(lines)), 'jsonl')) == 1
+    assert importer.skipped == {'duplicate number': 1}
+    assert BugReport.query.filter_by(number=20).one().description == 'First'
+
+
+def test_import_skips_invalid_and_unknown_ids(app):
+    base = {'bug_type': 'Crash', 'description': 'Imported', 'created': '2024-01-03'}
+    rows = [{**base, 'number': 30, 'user_id': 'abc'}, {**base, 'number': 31, 'user_id': 1, 'sprint_id': 'x'},
+            {**base, 'number': 32, 'user_id': 99}, {**base, 'number': 33, 'user_id': 1, 'sprint_id': 99},
+            {**base, 'number': 34, 'user_id': '1', 'sprint_id': '2'}]
+    importer = BugReportImporter()
+    assert importer.run(rows) == 1
+    assert importer.skipped == {'invalid number, id or date': 2, 'unknown reporter': 1, 'unknown sprint': 1}
+    assert BugReport.query.filter_by(number=34).one().sprint_id == 2
+
+
+def test_import_bugs_command(app, tmp_path):
+    source = tmp_path / 'bugs.csv'
+    source.write_text(CSV_ROWS)
+    result = app.test_cli_runner().invoke(args=['import-bugs', str(source), '--batch-size', '100'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 bug reports' in result.output
+    assert 'Skipped 1 rows: unknown reporter' in result.output
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from app import create_app
+from duplicates import DuplicateIndex, minhash, estimated_similarity, find_duplicate_bug_reports, \
+    ensure_duplicate_index
+from models import db, User, Sprint, BugReport
+from utilities import hash_password
+
+ORIGINAL = 'The login page crashes with a null pointer error when the password field is left empty'
+NEAR_DUPLICATE = 'Login page crashes with null pointer error when the password field is empty!'
+UNRELATED = 'Sprint statistics chart labels overlap when there are more than ten sprints'
+
+
+@pytest.fixture
+def client():
+    """Create and configure a new app instance for each test."""
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def logged_in_client(client):
+    user = User(username="test_user", email="test_email@email.com", password=hash_password("test_password"),
+                employee_id="123456789")
+    sprint = Sprint(start_date='2024-01-01', end_date='2024-12-31', name='Sprint 1')
+    db.session.add_all([user, sprint])
+    db.session.commit()
+    db.session.add(BugReport(number=1, bug_type='Crash', description=ORIGINAL, is_open=True, is_fixed=False,
+                             reason_for_close="", user_id=user.id, sprint_id=sprint.id))
+    db.session.commit()
+    client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+    return client
+
+
+def test_minhash_estimates_similarity():
+    assert estimated_similarity(minhash(ORIGINAL), minhash(ORIGINAL)) == 1.0
+    assert estimated_similarity(minhash(ORIGINAL), minhash(NEAR_DUPLICATE)) > 0.6
+    assert estimated_similarity(minhash(ORIGINAL), minhash(UNRELATED)) < 0.2
+
+
+def test_index_candidates():
+    index = DuplicateIndex()
+    index.add(1, ORIGINAL)
+    index.add(2, UNRELATED)
+    assert [match[0] for match in index.candidates(NEAR_DUPLICATE)] == [1]
+    assert index.candidates(NEAR_DUPLICATE, exclude=1) == []
+    index.remove(1)
+    assert index.candidates(NEAR_DUPLICATE) == []
+
+
+def test_index_buckets_shrink_back_to_single_ids():
+    index = DuplicateIndex()
+    index.add(1, ORIGINAL)
+    index.add(2, ORIGINAL)
+    assert any(isinstance(members, set) for members in index.buckets.values())
+    index.remove(1)
+    assert set(index.buckets.values()) == {2}
+    assert [match[0] for match in index.candidates(NEAR_DUPLICATE)] == [2]
+
+
+def test_index_persists_updates(tmp_path):
+    path = str(tmp_path / 'duplicate_index.jsonl')
+    index = DuplicateIndex(path)
+    index.rebuild([(1, UNRELATED), (2, 'Export button does nothing')])
+    index.add(1, ORIGINAL)
+    index.remove(2)
+
+    reloaded = DuplicateIndex(path)
+    reloaded.refresh()
+    assert len(reloaded) == 1
+    assert reloaded.signatures == index.signatures
+    assert [match[0] for match in reloaded.candidates(NEAR_DUPLICATE)] == [1]
+
+
+def test_index_replays_other_processes_appends(tmp_path):
+    path = str(tmp_path / 'duplicate_index.jsonl')
+    index = DuplicateIndex(path)
+    assert index.candidates(ORIGINAL) == []
+    index.add(1, ORIGINAL)
+    assert not (tmp_path / 'duplicate_index.jsonl').exists()
+
+    index.rebuild([(1, UNRELATED)])
+    other_worker = DuplicateIndex(path)
+    other_worker.refresh()
+    index.add(2, ORIGINAL)
+    assert [match[0] for match in other_worker.candidates(NEAR_DUPLICATE)] == [2]
+    index.remove(2)
+    assert other_worker.candidates(NEAR_DUPLICATE) == []
+
+    DuplicateIndex(path).rebuild([(3, ORIGINAL)])
+    assert [match[0] for match in other_worker.candidates(NEAR_DUPLICATE)] == [3]
+
+
+def test_ensure_duplicate_index_builds_missing_log(logged_in_client, tmp_path):
+    path = tmp_path / 'duplicate_index.jsonl'
+    logged_in_client.application.config['DUPLICATE_INDEX_PATH'] = str(path)
+    assert ensure_duplicate_index()
+    assert not ensure_duplicate_index()
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_index_reads_logs_with_full_signatures(tmp_path):
+    path = tmp_path / 'duplicate_index.jsonl'
+    signature = [value + (1 << 40) for value in minhash(ORIGINAL)]
+    path.write_text(json.dumps({'generation': 'old'}) + '\n' + json.dumps({'id': 1, 'signature': signature}) + '\n')
+    index = DuplicateIndex(str(path))
+    index.refresh()
+    assert index.signatures[1] == minhash(ORIGINAL)
+
+
+def test_bug_report_route_suggests_duplicates(logged_in_client):
+    response = logged_in_client.post('/bug_report', data={
+        'report_number': '2',
+        'bug_type': 'Crash',
+        'bug_summary': NEAR_DUPLICATE,
+        'current_date': '2024-03-01',
+    }, follow_redirects=True)
+    assert b'Bug Report Created' in response.data
+    assert b'Possible duplicates: #1' in response.data
+    assert [number for number, _ in find_duplicate_bug_reports(ORIGINAL, exclude=1)] == [2]
+
+
+def test_edit_bug_report_updates_index(logged_in_client):
+    logged_in_client.post('/edit_bug_report/1', data={'description': UNRELATED})
+    assert find_duplicate_bug_reports(NEAR_DUPLICATE) == []
+    assert [number for number, _ in find_duplicate_bug_reports(UNRELATED)] == [1]
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+from identity import CachedUser, IdentityCache
+
+
+def make_user(user_id):
+    return CachedUser(SimpleNamespace(id=user_id, username=f'user{user_id}', email=f'user{user_id}@example.com',
+                                      digest_notifications=False))
+
+
+def test_identity_cache_evicts_least_recently_used():
+    cache = IdentityCache(maxsize=2, ttl=60)
+    for user_id in (1, 2):
+        cache.put(user_id, make_user(user_id))
+    assert cache.get(1).username == 'user1'
+    cache.put(3, make_user(3))
+    assert cache.get(2) is None
+    assert [cache.get(user_id).get_id() for user_id in (1, 3)] == ['1', '3']
+
+
+def test_identity_cache_expires_and_invalidates_entries():
+    now = [0.0]
+    cache = IdentityCache(maxsize=10, ttl=60, clock=lambda: now[0])
+    cache.put(1, make_user(1))
+    cache.put(2, make_user(2))
+    now[0] = 59
+    assert cache.get(1) is not None
+    cache.invalidate(2)
+    assert cache.get(2) is None
+    now[0] = 60
+    assert cache.get(1) is None
+    assert len(cache) == 0
@@ -0,0 +1,49 @@
+import sys
+
+from flask import Flask
+
+from instrumentation import Histogram, Metrics, fold_stack, timed
+
+
+def test_histogram_exposition_is_cumulative():
+    histogram = Histogram('demo_seconds', 'Demo.', 'endpoint', buckets=(0.1, 1.0))
+    histogram.observe('home', 0.05)
+    histogram.observe('home', 0.5)
+    histogram.observe('home', 5)
+    histogram.observe('say "hi"', 0.05)
+    assert histogram.exposition() == [
+        '# HELP demo_seconds Demo.',
+        '# TYPE demo_seconds histogram',
+        'demo_seconds_bucket{endpoint="home",le="0.1"} 1',
+        'demo_seconds_bucket{endpoint="home",le="1"} 2',
+        'demo_seconds_bucket{endpoint="home",le="+Inf"} 3',
+        'demo_seconds_sum{endpoint="home"} 5.550000',
+        'demo_seconds_count{endpoint="home"} 3',
+        'demo_seconds_bucket{endpoint="say \\"hi\\"",le="0.1"} 1',
+        'demo_seconds_bucket{endpoint="say \\"hi\\"",le="1"} 1',
+        'demo_seconds_bucket{endpoint="say \\"hi\\"",le="+Inf"} 1',
+        'demo_seconds_sum{endpoint="say \\"hi\\""} 0.050000',
+        'demo_seconds_count{endpoint="say \\"hi\\""} 1',
+    ]
+
+
+def test_timed_is_a_noop_without_metrics():
+    with timed('email'):
+        pass
+    app = Flask(__name__)
+    with app.app_context():
+        with timed('email'):
+            pass
+        app.extensions['metrics'] = Metrics()
+        with timed('email'):
+            pass
+        assert app.extensions['metrics'].section_seconds.count('email') == 1
+
+
+def test_fold_stack_lists_outermost_frame_first():
+    def inner():
+        return fold_stack(sys._getframe())
+
+    frames = inner().split(';')
+    assert frames[-1].startswith('inner (test_instrumentation.py:')
+    assert frames[-2].startswith('test_fold_stack_lists_outermost_frame_first (')
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import inspect, text
+
+from app import create_app
+from migrations import upgrade_database
+from search import search_bug_reports
+from models import db, BugReport, SprintStats, User
+from utilities import bump_data_version, check_date_in_sprint, get_data_version
+
+# The legacy schema below is SQLite DDL.
+pytestmark = pytest.mark.sqlite_only
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR UNIQUE NOT NULL, '
+    'employee_id VARCHAR UNIQUE NOT NULL, password VARCHAR NOT NULL, email VARCHAR UNIQUE NOT NULL)',
+    'CREATE TABLE sprint (id INTEGER PRIMARY KEY, start_date VARCHAR NOT NULL, end_date VARCHAR NOT NULL, '
+    'name VARCHAR NOT NULL)',
+    'CREATE TABLE bug_report (id INTEGER PRIMARY KEY, number INTEGER UNIQUE NOT NULL, bug_type VARCHAR NOT NULL, '
+    'description TEXT NOT NULL, is_open BOOLEAN, is_fixed BOOLEAN, reason_for_close VARCHAR, '
+    'created VARCHAR NOT NULL, archived_at VARCHAR, user_id INTEGER NOT NULL REFERENCES user (id), '
+    'sprint_id INTEGER NOT NULL REFERENCES sprint (id))',
+    'CREATE TABLE bug_report_subscribers (bug_report_id INTEGER REFERENCES bug_report (id), '
+    'user_id INTEGER REFERENCES user (id), PRIMARY KEY (bug_report_id, user_id))',
+    "INSERT INTO user VALUES (1, 'test_user', '123456789', 'hash', 'test_email@email.com')",
+    "INSERT INTO sprint VALUES (1, '2024-01-01', '2024-01-14', 'Sprint 1')",
+    "INSERT INTO bug_report VALUES (1, 1, 'Type A', 'Bug description', 1, 0, '', "
+    "'2024-01-02 10:30:00.123456', NULL, 1, 1)",
+]
+
+
+@pytest.fixture
+def legacy_app():
+    app = create_app(testing=True)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_upgrade_database_adds_indexes(legacy_app):
+    changes = upgrade_database()
+    assert 'ix_sprint_end_date_start_date' in changes
+    assert 'ix_bug_report_sprint_id_is_open_is_fixed' in changes
+    bug_report_indexes = {index['name'] for index in inspect(db.engine).get_indexes('bug_report')}
+    assert {'ix_bug_report_user_id', 'ix_bug_report_created'} <= bug_report_indexes
+
+
+def test_upgrade_database_is_idempotent(legacy_app):
+    upgrade_database()
+    assert upgrade_database() == []
+
+
+def test_upgrade_database_keeps_legacy_rows_readable(legacy_app):
+    upgrade_database()
+    assert check_date_in_sprint('2024-01-07').id == 1
+    assert db.session.get(BugReport, 1).created.year == 2024
+
+
+def test_upgrade_database_adds_columns(legacy_app):
+    changes = upgrade_database()
+    assert 'user.digest_notifications' in changes
+    assert db.session.get(User, 1).digest_notifications is False
+    assert 'bug_report.version' in changes
+    assert db.session.get(BugReport, 1).version == 1
+    assert 'bug_report.resolved_at' in changes
+
+
+def test_upgrade_database_seeds_data_version(legacy_app):
+    with db.engine.begin() as connection:
+        connection.execute(text('CREATE TABLE data_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL, '
+                                'updated_at DATETIME NOT NULL)'))
+    assert 'data_version row' in upgrade_database()
+    bump_data_version()
+    db.session.commit()
+    assert get_data_version()[0] == 1
+
+
+def test_upgrade_database_stops_bug_report_id_reuse(legacy_app):
+    assert 'bug_report AUTOINCREMENT' in upgrade_database()
+    schema = db.session.execute(text("SELECT sql FROM sqlite_master WHERE name = 'bug_report'")).scalar()
+    assert 'AUTOINCREMENT' in schema
+    db.session.execute(text('DELETE FROM bug_report'))
+    db.session.add(BugReport(number=2, bug_type='Type A', description='Rebuilt table', user_id=1, sprint_id=1))
+    db.session.commit()
+    # The id of the deleted report is not handed out again, and the triggers came through the rebuild.
+    assert BugReport.query.one().id == 2
+    assert [report.number for report in search_bug_reports('rebuilt')[0]] == [2]
+    assert db.session.get(SprintStats, 1).total == 1
@@ -0,0 +1,205 @@
+import socket
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app import create_app
+from models import db, User, Sprint, BugReport, EmailOutbox
+from notifications import drain_outbox, enqueue_email, OutboxWorker, MAX_ATTEMPTS, claim_outbox_batch, \
+    claim_statement
+from utilities import hash_password, send_emails
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.handshakes = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.handshakes += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 Message accepted for delivery'
+
+
+@pytest.fixture
+def smtp_env(monkeypatch):
+    port = free_port()
+    monkeypatch.setenv('smtp_server', '127.0.0.1')
+    monkeypatch.setenv('port', str(port))
+    monkeypatch.setenv('smtp_ssl', 'false')
+    monkeypatch.setenv('sender_email', 'brs@example.com')
+    monkeypatch.delenv('password', raising=False)
+    return port
+
+
+@pytest.fixture
+def smtp_server(smtp_env):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=smtp_env)
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def client():
+    """Create and configure a new app instance for each test."""
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def subscribed_client(client):
+    user = User(username="test_user", email="test_email@email.com", password=hash_password("test_password"),
+                employee_id="123456789")
+    sprint = Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1')
+    db.session.add_all([user, sprint])
+    db.session.commit()
+    bug_report = BugReport(number=1, bug_type='Type A', description='Bug description', is_open=True,
+                           is_fixed=False, reason_for_close="", user_id=user.id, sprint_id=sprint.id)
+    bug_report.subscribers.append(user)
+    db.session.add(bug_report)
+    db.session.commit()
+    client.post('/login', data={'username': 'test_user', 'password': 'test_password'})
+    return client
+
+
+def test_close_bug_report_enqueues_instead_of_sending(subscribed_client, smtp_server):
+    response = subscribed_client.post('/bug_report/close/1', data={'close_reason': 'Duplicate'})
+    assert response.status_code == 302
+    assert smtp_server.messages == []
+    queued = EmailOutbox.query.one()
+    assert queued.recipient == 'test_email@email.com'
+    assert queued.status == 'pending'
+    assert 'Duplicate' in queued.body
+
+
+def test_drain_outbox_delivers(subscribed_client, smtp_server):
+    subscribed_client.post('/bug_report/fix/1', data={})
+    assert drain_outbox() == 1
+    assert [message.rcpt_tos for message in smtp_server.messages] == [['test_email@email.com']]
+    assert b'Bug report #1 is fixed' in smtp_server.messages[0].content
+    queued = EmailOutbox.query.one()
+    assert queued.status == 'sent'
+    assert queued.attempts == 1
+    assert drain_outbox() == 0
+
+
+def test_drain_outbox_backs_off_on_failure(client, smtp_env):
+    enqueue_email('receiver@example.com', 'Subject', 'Body')
+    db.session.commit()
+    now = datetime.utcnow()
+    assert drain_outbox(now=now) == 1
+    queued = EmailOutbox.query.one()
+    assert queued.status == 'pending'
+    assert queued.attempts == 1
+    assert queued.next_attempt_at > now
+    assert drain_outbox(now=now) == 0
+
+    for attempt in range(2, MAX_ATTEMPTS + 1):
+        now += timedelta(days=1)
+        drain_outbox(now=now)
+    assert EmailOutbox.query.one().status == 'failed'
+
+
+def test_drain_outbox_reclaims_expired_leases(client, smtp_server):
+    db.session.add(EmailOutbox(recipient='receiver@example.com', subject='Subject', body='Body', status='sending',
+                               claimed_by='dead-worker', next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    assert drain_outbox() == 1
+    assert EmailOutbox.query.one().status == 'sent'
+
+
+@pytest.mark.postgresql_only
+def test_concurrent_claimers_take_disjoint_rows(client):
+    now = datetime.utcnow()
+    db.session.add_all(EmailOutbox(recipient=f'receiver{i}@example.com', subject='Subject', body='Body',
+                                   next_attempt_at=now - timedelta(seconds=i)) for i in range(5))
+    db.session.commit()
+    with db.engine.connect() as other_drainer:
+        # The other drainer holds its claim uncommitted; without SKIP LOCKED this claim would wait on its locks.
+        other_drainer.execute(claim_statement(now, 'other-drainer', 2))
+        db.session.execute(db.text("SET LOCAL lock_timeout = '2s'"))
+        claimed = claim_outbox_batch(now, batch_size=5)
+        other_drainer.commit()
+    assert len(claimed) == 3
+    assert EmailOutbox.query.filter_by(claimed_by='other-drainer').count() == 2
+    assert claim_outbox_batch(now, batch_size=5) == []
+
+
+def test_outbox_worker_delivers_in_background(subscribed_client, smtp_server):
+    subscribed_client.post('/bug_report/close/1', data={'close_reason': 'Duplicate'})
+    worker = OutboxWorker(subscribed_client.application, poll_seconds=0.05)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not smtp_server.messages and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert len(smtp_server.messages) == 1
+
+
+def test_send_emails_uses_one_connection(smtp_server):
+    errors = send_emails((f'subscriber{i}@example.com', 'Subject', 'Body') for i in range(20))
+    assert errors == [None] * 20
+    assert len(smtp_server.messages) == 20
+    assert smtp_server.handshakes == 1
+
+
+def test_send_emails_reports_connection_failure(smtp_env):
+    errors = send_emails([('a@example.com', 'Subject', 'Body'), ('b@example.com', 'Subject', 'Body')])
+    assert len(errors) == 2
+    assert all(isinstance(error, OSError) for error in errors)
+
+
+def test_digest_subscriber_gets_one_coalesced_email(subscribed_client, smtp_server):
+    subscribed_client.post('/notification_settings', data={'digest_notifications': 'y'})
+    assert User.query.one().digest_notifications
+    user = User.query.one()
+    bug_report = BugReport(number=2, bug_type='Type A', description='Second bug', is_open=True,
+                           is_fixed=False, reason_for_close="", user_id=user.id, sprint_id=1)
+    bug_report.subscribers.append(user)
+    db.session.add(bug_report)
+    db.session.commit()
+
+    subscribed_client.post('/bug_report/close/1', data={'close_reason': 'Duplicate'})
+    subscribed_client.post('/bug_report/fix/2', data={})
+    assert drain_outbox() == 0
+    assert smtp_server.messages == []
+
+    assert drain_outbox(now=datetime.utcnow() + timedelta(hours=2)) == 1
+    assert len(smtp_server.messages) == 1
+    content = smtp_server.messages[0].content
+    assert b'2 bug report updates' in content
+    assert b'Bug report #1 is closed' in content
+    assert b'Bug report #2 is fixed' in content
+    assert EmailOutbox.query.filter_by(status='digested').count() == 2
+
+
+def test_notification_settings_route(subscribed_client):
+    response = subscribed_client.get('/notification_settings')
+    assert response.status_code == 200
+    response = subscribed_client.post('/notification_settings', data={'digest_notifications': 'y'})
+    assert b'Notification settings saved' in response.data
+    subscribed_client.post('/notification_settings', data={})
+    assert not User.query.one().digest_notifications
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from passwords import PasswordHasher, PasswordHasherBusy, hash_parameters, needs_rehash
+
+
+def test_needs_rehash_compares_stored_parameters():
+    assert hash_parameters('scrypt') == 'scrypt:32768:8:1'
+    assert not needs_rehash(generate_password_hash('secret', method='scrypt:32768:8:1'), 'scrypt')
+    assert needs_rehash(generate_password_hash('secret', method='scrypt:16384:8:1'), 'scrypt')
+    assert needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'), 'scrypt')
+
+
+def test_hasher_round_trip():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=2, max_pending=4, queue_timeout=1)
+    password_hash = hasher.hash('secret')
+    assert password_hash.startswith('pbkdf2:sha256:1000$')
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.verify(password_hash, 'wrong')
+
+
+def test_verify_without_stored_hash_still_hashes(monkeypatch):
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, max_pending=1, queue_timeout=1)
+    checked = []
+    monkeypatch.setattr('passwords.check_password_hash', lambda *args: checked.append(args) or True)
+    assert hasher.verify(None, 'secret') is False
+    assert checked == [(hasher.dummy_hash, 'secret')]
+    assert hasher.dummy_hash.startswith('pbkdf2:sha256:1000$')
+
+
+def test_hasher_rejects_work_beyond_max_pending():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, max_pending=1, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def occupy():
+        started.set()
+        release.wait()
+
+    holder = threading.Thread(target=hasher._run, args=(occupy,))
+    holder.start()
+    started.wait()
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('secret')
+    release.set()
+    holder.join()
+    assert hasher.verify(hasher.hash('secret'), 'secret')
@@ -0,0 +1,66 @@
+import csv
+import io
+
+import pytest
+from werkzeug.security import check_password_hash
+
+from app import create_app
+from models import db, User
+from passwords import PasswordHasher
+from provisioning import UserProvisioner
+
+HR_ROWS = '''username,employee_id,email,password
+alice,1001,alice@example.com,alice-password
+bob,1002,bob@example.com,
+taken,1003,carol@example.com,
+carol,123456789,carol2@example.com,
+dave,1004,not-an-email,
+erin,1005,alice@example.com,
+,1006,frank@example.com,
+'''
+
+
+@pytest.fixture
+def app():
+    app = create_app(testing=True)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="taken", email="test_email@email.com", password="hash", employee_id="123456789"))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def hasher():
+    return PasswordHasher('pbkdf2:sha256:1000', workers=2, max_pending=2, queue_timeout=None)
+
+
+def test_provision_users(app, hasher):
+    credentials = []
+    provisioner = UserProvisioner(hasher, batch_size=3, on_credentials=credentials.append)
+    assert provisioner.run(csv.DictReader(io.StringIO(HR_ROWS))) == 2
+    assert provisioner.skipped == {'username already exists': 1, 'employee_id already exists': 1,
+                                   'invalid email': 1, 'email already exists': 1, 'missing username': 1}
+    alice = User.query.filter_by(username='alice').one()
+    assert check_password_hash(alice.password, 'alice-password')
+    [(username, email, password)] = credentials
+    assert (username, email) == ('bob', 'bob@example.com')
+    assert check_password_hash(User.query.filter_by(username='bob').one().password, password)
+
+
+def test_rows_without_password_need_a_credentials_sink(app, hasher):
+    provisioner = UserProvisioner(hasher)
+    provisioner.run([{'username': 'bob', 'employee_id': '1002', 'email': 'bob@example.com'}])
+    assert provisioner.provisioned == 0
+    assert provisioner.skipped == {'no password and no credentials file': 1}
+
+
+def test_provision_users_command(app, tmp_path):
+    source = tmp_path / 'hr.csv'
+    source.write_text(HR_ROWS)
+    result = app.test_cli_runner().invoke(args=['provision-users', str(source), '--credentials',
+                                                str(tmp_path / 'credentials.csv'), '--hash-workers', '2'])
+    assert 'Provisioned 2 users' in result.output
+    assert (tmp_path / 'credentials.csv').read_text().splitlines()[0] == 'username,email,password'
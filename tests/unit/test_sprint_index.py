@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+from app import create_app
+from models import db, Sprint
+from sprint_index import SprintIntervalIndex, get_sprint_index
+from utilities import find_sprint_id_for_date
+
+
+@pytest.fixture
+def client():
+    """Create and configure a new app instance for each test."""
+    app = create_app(testing=True)
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def index():
+    sprint_index = SprintIntervalIndex()
+    sprint_index.build([
+        (date(2024, 1, 1), date(2024, 1, 14), 1),
+        (date(2024, 1, 15), date(2024, 1, 28), 2),
+        (date(2024, 3, 1), date(2024, 3, 14), 3),
+    ])
+    return sprint_index
+
+
+@pytest.mark.parametrize("day, expected", [
+    (date(2024, 1, 1), 1),
+    (date(2024, 1, 14), 1),
+    (date(2024, 1, 15), 2),
+    (date(2024, 2, 10), None),
+    (date(2023, 12, 31), None),
+    (date(2024, 3, 14), 3),
+    (date(2024, 3, 15), None),
+])
+def test_lookup(index, day, expected):
+    assert index.lookup(day) == expected
+
+
+def test_lookup_overlapping_sprints():
+    sprint_index = SprintIntervalIndex()
+    sprint_index.build([(date(2024, 1, 1), date(2024, 12, 31), 1), (date(2024, 2, 1), date(2024, 2, 14), 2)])
+    assert sprint_index.lookup(date(2024, 6, 1)) == 1
+    assert sprint_index.lookup(date(2024, 2, 2)) in (1, 2)
+
+
+def test_find_sprint_id_for_date_uses_index(client):
+    db.session.add(Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1'))
+    db.session.commit()
+    assert find_sprint_id_for_date('2024-01-05') == 1
+    assert find_sprint_id_for_date('2024-02-05') is None
+    assert find_sprint_id_for_date('not a date') is None
+
+
+def test_find_sprint_id_for_date_sees_sprints_created_after_build(client):
+    assert find_sprint_id_for_date('2024-01-05') is None
+    db.session.add(Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1'))
+    db.session.commit()
+    assert find_sprint_id_for_date('2024-01-05') == 1
+    assert get_sprint_index().lookup(date(2024, 1, 5)) == 1
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from archive import archive_bug_reports
+from models import db, User, Sprint, BugReport, SprintStats
+from sprint_stats import check_sprint_stats, rebuild_sprint_stats
+from utilities import get_sprint_bug_counts, hash_password
+from workflow import fix_bug, transition_bugs
+
+
+@pytest.fixture
+def client():
+    app = create_app(testing=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            user = User(username="test_user", email="test_email@email.com", password=hash_password("test_password"),
+                        employee_id="123456789")
+            db.session.add_all([user, Sprint(start_date='2024-01-01', end_date='2024-01-14', name='Sprint 1'),
+                                Sprint(start_date='2024-01-15', end_date='2024-01-28', name='Sprint 2')])
+            db.session.commit()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+def add_reports(numbers, sprint_id=1):
+    db.session.execute(db.insert(BugReport), [
+        {'number': number, 'bug_type': 'Type A', 'description': f'Bug {number}', 'is_open': True, 'is_fixed': False,
+         'reason_for_close': '', 'user_id': 1, 'sprint_id': sprint_id, 'created': datetime(2024, 1, 2)}
+        for number in numbers])
+    db.session.commit()
+
+
+def stats(sprint_id):
+    row = db.session.get(SprintStats, sprint_id, populate_existing=True)
+    return (row.total, row.open, row.fixed) if row else None
+
+
+def test_counters_follow_every_write_path(client):
+    add_reports([1, 2, 3])
+    db.session.add(BugReport(number=4, bug_type='Type A', description='Bug 4', is_open=True, is_fixed=False,
+                             reason_for_close='', user_id=1, sprint_id=2, created=datetime(2024, 1, 16)))
+    db.session.commit()
+    assert (stats(1), stats(2)) == ((3, 3, 0), (1, 1, 0))
+
+    fix_bug(BugReport.query.filter_by(number=1).one())
+    transition_bugs([2, 3], 'closed', 'Duplicate')
+    assert stats(1) == (3, 0, 1)
+
+    report = BugReport.query.filter_by(number=4).one()
+    report.sprint_id = 1
+    db.session.commit()
+    assert (stats(1), stats(2)) == ((4, 1, 1), (0, 0, 0))
+
+    archive_bug_reports(older_than_days=0, now=datetime.utcnow())
+    assert stats(1) == (4, 1, 1)
+    db.session.delete(report)
+    db.session.commit()
+    assert stats(1) == (3, 0, 1)
+    assert check_sprint_stats() == {}
+
+    assert [(row.name, row.total, row.open, row.fixed) for row in get_sprint_bug_counts()] == [
+        ('Sprint 2', 0, 0, 0), ('Sprint 1', 3, 0, 1)]
+
+
+def test_check_detects_and_rebuild_repairs_drift(client):
+    add_reports([1, 2])
+    db.session.execute(db.update(SprintStats).values(total=7))
+    db.session.commit()
+    assert check_sprint_stats() == {1: ((7, 2, 0), (2, 2, 0))}
+
+    with db.engine.begin() as connection:
+        rebuild_sprint_stats(connection)
+    assert check_sprint_stats() == {}
+    assert stats(1) == (2, 2, 0)
+
+
+def test_check_sprint_stats_command(client):
+    add_reports([1])
+    runner = client.application.test_cli_runner()
+    assert 'consistent' in runner.invoke(args=['check-sprint-stats']).output
+
+    db.session.execute(db.delete(SprintStats))
+    db.session.commit()
+    result = runner.invoke(args=['check-sprint-stats'])
+    assert result.exit_code == 1
+    assert 'Sprint 1: stored total/open/fixed (0, 0, 0), actual (1, 1, 0)' in result.output
+
+    result = runner.invoke(args=['check-sprint-stats', '--repair'])
+    assert 'Rebuilt sprint statistics' in result.output
+    assert stats(1) == (1, 1, 0)
@@ -1,9 +1,12 @@
+import smtplib
+
 import pytest
 
 from app import create_app
 from models import db, User, Sprint, BugReport
 from utilities import check_existing_employee, hash_password, check_existing_username, send_email, check_date_in_sprint, \
-    check_existing_sprint_by_name, check_existing_bug_report_by_number, check_existing_email
+    check_existing_sprint_by_name, check_existing_bug_report_by_number, check_existing_email, get_sprint_bug_counts, \
+    SMTPSession
 
 
 @pytest.fixture
@@ -59,6 +62,30 @@ def mock_smtp(monkeypatch):
     return MockSMTP
 
 
+@pytest.fixture
+def flaky_smtp(monkeypatch):
+    class FlakySMTP:
+        instances = []
+
+        def __init__(self, *args, **kwargs):
+            self.sent = []
+            FlakySMTP.instances.append(self)
+
+        def sendmail(self, sender, receiver, message):
+            if len(FlakySMTP.instances) == 1 and self.sent:
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+            self.sent.append(receiver)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            pass
+
+    monkeypatch.setattr("utilities.smtplib.SMTP_SSL", FlakySMTP)
+    return FlakySMTP
+
+
 @pytest.mark.parametrize("employee_id, expected", [
     ("123456789", True),
     ("987654321", False)
@@ -113,12 +140,31 @@ def test_check_date_in_sprint(dataClient, date, expected):
     assert (result is not None) == expected
 
 
-def test_hash_password():
+def test_hash_password(client):
     password = "test_password"
     hashed_password = hash_password(password)
     assert hashed_password != password
-    assert len(hashed_password) > 0
+    assert hashed_password.startswith(client.application.config['PASSWORD_HASH_METHOD'])
 
 
 def test_send_email(mock_smtp):
     assert send_email('receiver@example.com', 'Test Subject', 'Test Body') == 1
+
+
+def test_get_sprint_bug_counts(dataClient):
+    db.session.add(Sprint(start_date='2024-01-15', end_date='2024-01-28', name='Empty Sprint'))
+    db.session.add(BugReport(number=2, bug_type='Type A', description='Description B',
+                             is_open=False, is_fixed=True, user_id=1, sprint_id=1))
+    db.session.add(BugReport(number=3, bug_type='Type A', description='Description C',
+                             is_open=False, is_fixed=False, user_id=1, sprint_id=1))
+    db.session.commit()
+    counts = [(row.name, row.total, row.open, row.fixed) for row in get_sprint_bug_counts()]
+    assert counts == [('Empty Sprint', 0, 0, 0), ('Test Sprint', 3, 1, 1)]
+
+
+def test_smtp_session_reconnects_after_disconnect(flaky_smtp):
+    with SMTPSession() as session:
+        for receiver in ('a@example.com', 'b@example.com', 'c@example.com'):
+            session.send(receiver, 'Subject', 'Body')
+    assert session.connections == 2
+    assert [instance.sent for instance in flaky_smtp.instances] == [['a@example.com'], ['b@example.com', 'c@example.com']]
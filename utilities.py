@@ -1,12 +1,23 @@
 import os, smtplib, ssl, dotenv
+from contextlib import ExitStack
+from datetime import date as date_type, datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from werkzeug.security import generate_password_hash
-from models import User, BugReport, Sprint
+from functools import lru_cache
+from sqlalchemy.orm import joinedload, selectinload
+from instrumentation import timed
+from models import User, BugReport, Sprint, DataVersion, db, bug_report_subscribers, ArchivedBugReport, \
+    SprintStats
+from passwords import get_password_hasher
+from sprint_index import get_sprint_index
 
 if not dotenv.load_dotenv():
     print('..env file missing, please add it to root file directory')
 
+BUG_STATUSES = ('open', 'fixed', 'closed')
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 
 def check_existing_employee(employee_id):
     existing_employee = User.query.filter_by(employee_id=employee_id).first()
@@ -26,42 +37,276 @@ def check_existing_email(email):
     return User.query.filter_by(email=email).first()
 
 
+USER_UNIQUE_FIELDS = {'username': 'Username', 'employee_id': 'Employee ID', 'email': 'Email'}
+
+
+def find_user_conflicts(username, employee_id, email):
+    # Which of the unique user fields are already taken, in one query.
+    values = {'username': username, 'employee_id': employee_id, 'email': email}
+    rows = db.session.execute(db.select(User.username, User.employee_id, User.email).where(db.or_(
+        User.username == username, User.employee_id == employee_id, User.email == email))).all()
+    return [field for field in USER_UNIQUE_FIELDS if any(getattr(row, field) == values[field] for row in rows)]
+
+
 def check_existing_bug_report_by_number(number):
     return BugReport.query.filter_by(number=number).first()
 
 
+def get_bug_report_detail(number):
+    # Everything bug.html renders, in two queries: the report joined to its sprint and reporter, then its subscribers.
+    return BugReport.query.options(
+        joinedload(BugReport.sprint), joinedload(BugReport.reporter), selectinload(BugReport.subscribers)
+    ).filter_by(number=number).first()
+
+
+def get_archived_bug_report(number):
+    return ArchivedBugReport.query.filter_by(number=number).first()
+
+
+def bug_number_exists(number):
+    # Archived reports keep their numbers, so a number is taken if it is live or archived.
+    return db.session.execute(db.select(db.or_(
+        db.exists().where(BugReport.number == number), db.exists().where(ArchivedBugReport.number == number)
+    ))).scalar()
+
+
+def is_subscribed(bug_report_id, user_id):
+    return db.session.execute(db.select(db.exists().where(
+        bug_report_subscribers.c.bug_report_id == bug_report_id, bug_report_subscribers.c.user_id == user_id
+    ))).scalar()
+
+
+def subscribe_user(bug_report_id, user_id):
+    db.session.execute(db.insert(bug_report_subscribers).values(bug_report_id=bug_report_id, user_id=user_id))
+
+
+def unsubscribe_user(bug_report_id, user_id):
+    db.session.execute(db.delete(bug_report_subscribers).where(
+        bug_report_subscribers.c.bug_report_id == bug_report_id, bug_report_subscribers.c.user_id == user_id
+    ))
+
+
 def check_existing_sprint_by_name(sprint_name):
     existing_sprint = Sprint.query.filter_by(name=sprint_name).first()
     return existing_sprint
 
 
+def parse_date(value):
+    if isinstance(value, str):
+        try:
+            return date_type.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
 def check_date_in_sprint(date):
+    date = parse_date(date)
+    if date is None:
+        return None
     existing_sprint = Sprint.query.filter(Sprint.start_date <= date, Sprint.end_date >= date).first()
     return existing_sprint
 
 
+def find_sprint_id_for_date(date):
+    date = parse_date(date)
+    if date is None:
+        return None
+    sprint_index = get_sprint_index()
+    sprint_id = sprint_index.lookup(date)
+    if sprint_id is None:
+        # The sprint may have been created by another worker since this index was built, so misses are confirmed
+        # against the database before they are reported.
+        existing_sprint = check_date_in_sprint(date)
+        if existing_sprint is not None:
+            sprint_index.invalidate()
+            return existing_sprint.id
+    return sprint_id
+
+
+def bug_filters_from_args(args):
+    filters = {
+        'status': args.get('status') if args.get('status') in BUG_STATUSES else None,
+        'bug_type': args.get('bug_type') or None,
+        'sprint_id': args.get('sprint_id', type=int),
+        'reporter': args.get('reporter') or None,
+    }
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def page_size_from_args(args):
+    return max(1, min(args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+
+def parse_bug_numbers(text):
+    # Accepts numbers separated by commas and/or whitespace; returns None if any entry is not a number.
+    try:
+        return [int(number) for number in text.replace(',', ' ').split()]
+    except ValueError:
+        return None
+
+
+def bug_status(report):
+    if report.is_open:
+        return 'open'
+    return 'fixed' if report.is_fixed else 'closed'
+
+
+def filter_bug_reports(query, status=None, bug_type=None, sprint_id=None, reporter=None, model=BugReport):
+    if status == 'open':
+        query = query.filter_by(is_open=True)
+    elif status == 'fixed':
+        query = query.filter_by(is_fixed=True)
+    elif status == 'closed':
+        query = query.filter_by(is_open=False, is_fixed=False)
+    if bug_type is not None:
+        query = query.filter_by(bug_type=bug_type)
+    if sprint_id is not None:
+        query = query.filter_by(sprint_id=sprint_id)
+    if reporter is not None:
+        reporter_id = db.select(User.id).where(User.username == reporter).scalar_subquery()
+        query = query.filter(model.user_id == reporter_id)
+    return query
+
+
+def get_bug_reports_page(after=None, limit=PAGE_SIZE, **filters):
+    # Keyset pagination on the unique report number: every page is an index range scan,
+    # so the cost does not grow with how deep into the table the page is.
+    query = filter_bug_reports(BugReport.query, **filters)
+    if after is not None:
+        query = query.filter(BugReport.number > after)
+    rows = query.order_by(BugReport.number).limit(limit + 1).all()
+    next_after = rows[limit - 1].number if len(rows) > limit else None
+    return rows[:limit], next_after
+
+
+def get_sprints_page(after=None, limit=PAGE_SIZE):
+    query = Sprint.query
+    if after is not None:
+        query = query.filter(Sprint.id > after)
+    rows = query.order_by(Sprint.id).limit(limit + 1).all()
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_after
+
+
+def get_sprint_bug_counts():
+    # Reads the trigger-maintained sprint_stats counters (live and archived reports) joined to the sprints, newest
+    # first; rows carry id, name, start_date, end_date, total, open and fixed.
+    return db.session.execute(
+        db.select(Sprint.id, Sprint.name, Sprint.start_date, Sprint.end_date,
+                  db.func.coalesce(SprintStats.total, 0).label('total'),
+                  db.func.coalesce(SprintStats.open, 0).label('open'),
+                  db.func.coalesce(SprintStats.fixed, 0).label('fixed'))
+        .outerjoin(SprintStats, SprintStats.sprint_id == Sprint.id)
+        .order_by(Sprint.start_date.desc())
+    ).all()
+
+
+def bump_data_version():
+    # Runs inside the caller's transaction; the increment happens in SQL so concurrent workers never reuse a version.
+    # The row is seeded when the table is created (models.seed_data_version).
+    db.session.execute(db.update(DataVersion).where(DataVersion.id == 1)
+                       .values(version=DataVersion.version + 1, updated_at=datetime.utcnow()))
+
+
+def get_data_version():
+    row = db.session.execute(db.select(DataVersion.version, DataVersion.updated_at).where(DataVersion.id == 1)).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
 def hash_password(password):
-    return generate_password_hash(password, method='pbkdf2')
+    # Same method, parameters and bounded pool as sign-ups and logins.
+    return get_password_hasher().hash(password)
 
 
-def send_email(receiver_email, subject, body, smtp_server=None, sender_email=None, password=None):
-    port = os.getenv('port') or 465
-    smtp_server = smtp_server or os.getenv("smtp_server")
-    sender_email = sender_email or os.getenv("sender_email")
-    password = password or os.getenv("password")
+@lru_cache(maxsize=None)
+def get_ssl_context():
+    return ssl.create_default_context()
+
 
+def build_email(sender_email, receiver_email, subject, body):
     message = MIMEMultipart()
     message["From"] = sender_email
     message["To"] = receiver_email
     message["Subject"] = subject
     message.attach(MIMEText(body, "plain"))
+    return message
+
+
+class SMTPSession:
+    """One authenticated SMTP connection reused for many messages, reconnecting once if the server drops it."""
+
+    def __init__(self, smtp_server=None, sender_email=None, password=None):
+        self.port = os.getenv('port') or 465
+        self.smtp_server = smtp_server or os.getenv("smtp_server")
+        self.sender_email = sender_email or os.getenv("sender_email")
+        self.password = password or os.getenv("password")
+        self.use_ssl = os.getenv('smtp_ssl', 'true').lower() != 'false'
+        self.connections = 0
+        self._server = None
+        self._stack = ExitStack()
+
+    def connect(self):
+        self.close()
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.port, context=get_ssl_context())
+        else:
+            server = smtplib.SMTP(self.smtp_server, self.port)
+        self._server = self._stack.enter_context(server)
+        self.connections += 1
+        if self.password and hasattr(server, 'login'):
+            server.login(self.sender_email, self.password)
+
+    def send(self, receiver_email, subject, body):
+        message = build_email(self.sender_email, receiver_email, subject, body).as_string()
+        if self._server is None:
+            self.connect()
+        try:
+            self._server.sendmail(self.sender_email, receiver_email, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.connect()
+            self._server.sendmail(self.sender_email, receiver_email, message)
 
+    def close(self):
+        self._server = None
+        try:
+            self._stack.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def send_emails(messages, smtp_server=None, sender_email=None, password=None):
+    # Delivers (receiver_email, subject, body) tuples over one connection; returns None or the error for each message.
+    messages = list(messages)
+    with timed('email'), SMTPSession(smtp_server, sender_email, password) as session:
+        try:
+            session.connect()
+        except Exception as error:
+            print("Connecting to the SMTP server failed due to:")
+            print(error)
+            return [error] * len(messages)
+        results = []
+        for receiver_email, subject, body in messages:
+            try:
+                session.send(receiver_email, subject, body)
+                results.append(None)
+            except Exception as error:
+                print(f"Sending email to {receiver_email} failed due to:")
+                print(error)
+                results.append(error)
+    return results
+
+
+def send_email(receiver_email, subject, body, smtp_server=None, sender_email=None, password=None):
     try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
-            if hasattr(server, 'login'):
-                server.login(sender_email, password)
-            server.sendmail(sender_email, receiver_email, message.as_string())
+        with timed('email'), SMTPSession(smtp_server, sender_email, password) as session:
+            session.send(receiver_email, subject, body)
         print(f"\nEmail Sent Successfully to {receiver_email}")
         return 1
     except Exception as error:
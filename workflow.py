@@ -0,0 +1,129 @@
+from datetime import datetime
+
+from duplicates import find_duplicate_bug_reports, get_duplicate_index
+from models import db, ArchivedBugReport, BugReport, Sprint, User, bug_report_subscribers
+from notifications import enqueue_email, notify_subscribers, wake_outbox_worker
+from sprint_index import get_sprint_index
+from utilities import bump_data_version
+
+
+def create_bug(number, bug_type, description, user_id, sprint_id, subscribe=False):
+    # Returns the new report and the (number, similarity) pairs of likely duplicates.
+    report = BugReport(number=number, bug_type=bug_type, description=description, is_open=True, is_fixed=False,
+                       reason_for_close="", user_id=user_id, sprint_id=sprint_id)
+    if subscribe:
+        report.subscribers.append(db.session.get(User, user_id))
+    db.session.add(report)
+    bump_data_version()
+    db.session.commit()
+    duplicates = find_duplicate_bug_reports(report.description, exclude=report.id)
+    get_duplicate_index().add(report.id, report.description)
+    return report, duplicates
+
+
+def edit_bug(report, number=None, bug_type=None, description=None):
+    if number:
+        report.number = number
+    if bug_type:
+        report.bug_type = bug_type
+    if description:
+        report.description = description
+    bump_data_version()
+    db.session.commit()
+    if description:
+        get_duplicate_index().add(report.id, report.description)
+
+
+def close_bug(report, reason):
+    if not report.is_open or report.is_fixed:
+        return False
+    report.is_open = False
+    report.reason_for_close = reason
+    report.resolved_at = datetime.utcnow()
+    bump_data_version()
+    notify_subscribers(report, f"Bug report #{report.number} is closed",
+                       f"Please see the bug report and reasoning below: \n\n{report.description}"
+                       f"\n\nReason:\n\n{report.reason_for_close}")
+    db.session.commit()
+    wake_outbox_worker()
+    return True
+
+
+def fix_bug(report):
+    if report.is_fixed or not report.is_open:
+        return False
+    report.is_fixed = True
+    report.is_open = False
+    report.resolved_at = datetime.utcnow()
+    bump_data_version()
+    notify_subscribers(report, f"Bug report #{report.number} is fixed",
+                       f"Please see the bug report below: \n\n{report.description}")
+    db.session.commit()
+    wake_outbox_worker()
+    return True
+
+
+BATCH_STATES = ('closed', 'fixed')
+MAX_BATCH_SIZE = 500
+
+
+def transition_bugs(numbers, state, reason=''):
+    # Closes or fixes many reports with one guarded UPDATE, so a report that changed in between is left alone.
+    # Returns {number: outcome}, where outcome is the new state, 'not_found' or 'unchanged' (including archived).
+    numbers = list(dict.fromkeys(numbers))
+    values = {'is_open': False, 'resolved_at': datetime.utcnow(), 'version': BugReport.version + 1}
+    if state == 'fixed':
+        values['is_fixed'] = True
+    else:
+        values['reason_for_close'] = reason
+    changed = db.session.execute(
+        db.update(BugReport).where(BugReport.number.in_(numbers), BugReport.is_open.is_(True),
+                                   BugReport.is_fixed.is_(False))
+        .values(**values).returning(BugReport.id, BugReport.number, BugReport.description)
+        .execution_options(synchronize_session=False)
+    ).all()
+    existing = set(db.session.scalars(db.union(
+        db.select(BugReport.number).where(BugReport.number.in_(numbers)),
+        db.select(ArchivedBugReport.number).where(ArchivedBugReport.number.in_(numbers)))))
+    changed_numbers = {report.number for report in changed}
+    outcomes = {number: state if number in changed_numbers else 'unchanged' if number in existing else 'not_found'
+                for number in numbers}
+    if changed:
+        notify_batch_subscribers(changed, state, reason)
+        bump_data_version()
+    db.session.commit()
+    if changed:
+        wake_outbox_worker()
+    return outcomes
+
+
+def notify_batch_subscribers(reports, state, reason):
+    # One email per subscriber listing every report of theirs in the batch, instead of one email per report.
+    reports_by_id = {report.id: report for report in reports}
+    rows = db.session.execute(
+        db.select(User.email, User.digest_notifications, bug_report_subscribers.c.bug_report_id)
+        .join(bug_report_subscribers, bug_report_subscribers.c.user_id == User.id)
+        .where(bug_report_subscribers.c.bug_report_id.in_(reports_by_id))
+        .order_by(User.email, bug_report_subscribers.c.bug_report_id)
+    ).all()
+    subscribed = {}
+    for row in rows:
+        subscribed.setdefault((row.email, row.digest_notifications), []).append(reports_by_id[row.bug_report_id])
+    for (email, digest), subscribed_reports in subscribed.items():
+        if len(subscribed_reports) == 1:
+            subject = f"Bug report #{subscribed_reports[0].number} is {state}"
+        else:
+            subject = f"{len(subscribed_reports)} bug reports are {state}"
+        body = "\n\n".join(f"#{report.number}: {report.description}" for report in subscribed_reports)
+        if state == 'closed':
+            body += f"\n\nReason:\n\n{reason}"
+        enqueue_email(email, subject, f"Please see the bug reports below: \n\n{body}", digest=digest)
+
+
+def create_sprint(name, start_date, end_date):
+    sprint = Sprint(start_date=start_date, end_date=end_date, name=name, bugs=[])
+    db.session.add(sprint)
+    bump_data_version()
+    db.session.commit()
+    get_sprint_index().invalidate()
+    return sprint
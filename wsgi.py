@@ -0,0 +1,15 @@
+"""Entry point for running the application under a multi-worker WSGI server, e.g.
+
+    flask --app app upgrade-db
+    gunicorn --workers 4 --threads 8 wsgi:app
+
+Importing the app does not touch the schema, so upgrade the database as a release step before starting the workers.
+Each worker replays the duplicate index log while it boots rather than inside its first bug report request.
+"""
+from app import app
+from duplicates import get_duplicate_index
+
+with app.app_context():
+    get_duplicate_index()
+
+__all__ = ['app']